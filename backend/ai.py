@@ -1,22 +1,28 @@
-from openai import OpenAI
 from dotenv import load_dotenv
 from pydantic import BaseModel
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from markdownify import markdownify as md
-from urllib.parse import urlparse
-from collections import deque
+from urllib.parse import urlparse, unquote
+from html.parser import HTMLParser
 import re
-import requests
+import json
+
+from fetch import fetch_page
+from page_cache import page_cache
+from html_extract import extract_page, PageExtract
+from llm import llm, MicroBatcher
+from prompt_budget import select_page_content, rank_links
+from frontier import CrawlFrontier
+from url_filter import prefilter_blog_urls, prefilter_site_links
+from llm_cache import llm_cache, cache_key, CachedResponse
+from crm_outbox import crm_outbox
+from metrics import metrics
 
 
 
 import os
 load_dotenv(dotenv_path=".env.local")
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 ai_model = "gpt-4o-mini"
+# Ask the LLM to choose between equally scored links instead of taking the first one
+crawl_llm_tie_break = os.getenv("CRAWL_LLM_TIE_BREAK", "0") == "1"
 
 class FilterSchema(BaseModel):
     """
@@ -37,7 +43,13 @@ def filter_personal_blogs(input_list: list[str]) -> list[str]:
         List of URLs that are likely personal blogs
     """
     print("original: ", len(input_list))
-    response = client.responses.parse(
+    accepted, ambiguous = prefilter_blog_urls(input_list)
+    print("after rule based filtering: ", len(accepted), "accepted, ", len(ambiguous), "for the LLM")
+    if not ambiguous:
+        return accepted
+    # Sorted so the same set of results always produces the same prompt and hits the LLM cache
+    input_list = sorted(ambiguous)
+    response = llm.parse(
         model=ai_model,
         input=[
             {"role": "system", "content": """Filter this list of URLs to include only URLs that are likely personal blogs maintained by actaul independent individuals. Remove any URLs for corporate blogs, company websites, software documentation sites, or non-personal content platforms. I'm specifically looking for authentic, personal blogs written by real individuals, not organizational, software tools, agencies  or commercial content."""},
@@ -47,10 +59,11 @@ def filter_personal_blogs(input_list: list[str]) -> list[str]:
             },
         ],
         text_format=FilterSchema,
+        name="filter_personal_blogs",
     )
     print("after filtering links: ", len(response.output_parsed.data))
 
-    return response.output_parsed.data
+    return accepted + response.output_parsed.data
 
 
 def filter_irrelavant_urls(input_list: list[str]) -> list[str]:
@@ -77,10 +90,17 @@ def filter_irrelavant_urls(input_list: list[str]) -> list[str]:
         5. Any course or products they are selling
     """
     print("Before removing irelavant urls: ", len(input_list))
-    response = client.responses.parse(
-        model=ai_model,
-        input=[
-            {"role": "system", "content": """ 
+    accepted, ambiguous = prefilter_site_links(input_list)
+    # When the rules already found contact/about/shop pages the rest isn't worth an LLM call
+    if accepted or not ambiguous:
+        print("After removing irrelavant urls (rules only): ", len(accepted))
+        return accepted
+    # Concurrent domains are classified together in a single request
+    filtered = irrelavant_urls_batcher(sorted(rank_links(ambiguous)))
+    print("After removing irrelavant urls: ", len(filtered))
+    return filtered
+
+irrelavant_urls_prompt = """ 
              Filter this list of URLs for a personal to include only URLs that are likely to contain the following information for outreach purposes:
                 - The email address of the owner
                 - The owners's name
@@ -88,55 +108,277 @@ def filter_irrelavant_urls(input_list: list[str]) -> list[str]:
                 - Any course or products they are selling
              Any URLs that are not likely contain this information are removed from the list.
              """
-            },
-            {
-                "role": "user",
-                "content": f"{input_list}",
-            },
+
+class URLGroupSchema(BaseModel):
+    """
+    Represents one group of filtered URLs in a batched response.
+    """
+    group: int
+    data: list[str]
+
+class BatchFilterSchema(BaseModel):
+    """
+    Represents the schema for the LLM response containing filtered URLs for several groups at once.
+    """
+    groups: list[URLGroupSchema]
+
+def filter_irrelavant_urls_batch(input_lists: list[list[str]]) -> list[list[str]]:
+    """
+    Same as filter_irrelavant_urls but for the links of several domains in one LLM request.
+    
+    Args:
+        input_lists: One list of URLs per domain
+        
+    Returns:
+        One filtered list per domain, in the same order
+    """
+    if len(input_lists) == 1:
+        return [filter_single_irrelavant_urls(input_lists[0])]
+    # Look every group up on its own first, batched responses would almost never repeat as a whole
+    results = {}
+    groups = {}
+    for index, urls in enumerate(input_lists):
+        cached = llm_cache.get(cache_key(ai_model, single_irrelavant_urls_input(urls), FilterSchema), FilterSchema) if llm_cache else None
+        if cached is not None:
+            results[index] = cached.output_parsed.data
+        else:
+            groups[index] = urls
+    if len(groups) <= 1:
+        for index, urls in groups.items():
+            results[index] = filter_single_irrelavant_urls(urls, lookup=False)
+        return [results[index] for index in range(len(input_lists))]
+    response = llm.parse(
+        model=ai_model,
+        input=[
+            {"role": "system", "content": irrelavant_urls_prompt + """
+             You are given several numbered groups of URLs, each group belongs to a different website.
+             Filter every group separately and return the kept URLs of each group under the same group number.
+             """},
+            {"role": "user", "content": f"{groups}"},
         ],
+        text_format=BatchFilterSchema,
+        name="filter_irrelavant_urls_batch",
+    )
+    for group in response.output_parsed.groups:
+        if group.group in groups and group.group not in results:
+            results[group.group] = group.data
+            if llm_cache:
+                key = cache_key(ai_model, single_irrelavant_urls_input(groups[group.group]), FilterSchema)
+                llm_cache.put(key, ai_model, CachedResponse(FilterSchema(data=group.data)))
+    # Groups the model dropped are classified on their own
+    missing = [index for index in groups if index not in results]
+    for index in missing:
+        results[index] = filter_single_irrelavant_urls(groups[index], lookup=False)
+    return [results[index] for index in range(len(input_lists))]
+
+def filter_single_irrelavant_urls(input_list, lookup=True):
+    # lookup=False when the group already missed the cache above, so the miss is not counted twice
+    response = llm.parse(
+        model=ai_model,
+        input=single_irrelavant_urls_input(input_list),
         text_format=FilterSchema,
+        name="filter_irrelavant_urls",
+        lookup=lookup,
     )
-    print("After removing irrelavant urls: ", len(response.output_parsed.data))
     return response.output_parsed.data
 
-def extract_blog_data_recursively(driver,links):
+def single_irrelavant_urls_input(input_list):
+    return [
+        {"role": "system", "content": irrelavant_urls_prompt},
+        {"role": "user", "content": f"{input_list}"},
+    ]
+
+irrelavant_urls_batcher = MicroBatcher(filter_irrelavant_urls_batch)
+
+def extract_blog_data_recursively(driver,links, deadline=None, home_url=None):
     """
-    Recursively extract blog data from a given domain.
+    Crawl the pages of a domain, most promising first, and extract the blog data from them.
+    Stops as soon as every required field is filled or the depth, page or time budget of the crawl frontier runs out.
     
     Args:
         driver: WebDriver instance
         links: List of links to follow for further extraction
+        deadline: Optional time.monotonic() value after which no more pages are visited
+        home_url: Optional homepage already loaded by extract_blog_content_and_links, checked for contact data first
     """
-    init_links = deque(links)
-    visited = set()
+    frontier = CrawlFrontier(deadline=deadline)
     extracted_content = {
         "email": None,
         "name": None,
         "bio": None,
         "course_product": None,
+        "socials": [],
     }
-    while len(init_links) > 0:
+    anchors = {}
+    if home_url:
         try:
-            best_url = best_url_to_follow(init_links, extracted_content)
-            print("Best URL to follow: ", best_url)
-            if best_url in visited:
-                init_links.remove(best_url)
-                continue
-            visited.add(best_url)
-            print("Links available to scrape: ", len(init_links))
-            driver.set_page_load_timeout(60)
-            driver.get(best_url)
-            page_content = extract_markdown_from_html(driver.page_source)
-            extracted_content = scrape_blog_data(extracted_content, page_content)
+            html_content, home_page = load_page(driver, home_url)
+            anchors = home_page.anchors
+            extract_contact_heuristics(extracted_content, html_content, home_url)
+        except Exception as e:
+            print(f"An error occurred: {e}")
+    for link in links:
+        frontier.push(link, 1, anchors)
+    tie_breaker = None
+    if crawl_llm_tie_break:
+        tie_breaker = lambda urls: best_url_to_follow(urls, extracted_content, anchors)
+    while missing_fields(extracted_content):
+        next_page = frontier.pop(tie_breaker)
+        if next_page is None:
+            print(f"Stopping crawl: {frontier.exhausted_reason()}")
+            break
+        best_url, depth = next_page
+        print("Best URL to follow: ", best_url)
+        try:
+            html_content, page = load_page(driver, best_url)
+            extract_contact_heuristics(extracted_content, html_content, best_url)
+            if missing_fields(extracted_content):
+                extracted_content = scrape_blog_data(extracted_content, page.markdown)
             print("Extracted Content: ", extracted_content)
-            if all(value is not None for value in extracted_content.values()):
-                print("All required data extracted.")
-                break
+            # Only promising links found along the way are queued, not every blog post
+            for link in page.links:
+                frontier.push(link, depth + 1, page.anchors, min_score=1)
         except Exception as e:
             print(f"An error occurred: {e}")
+    if not missing_fields(extracted_content):
+        print("All required data extracted.")
     return extracted_content
         
 
+def missing_fields(extracted_content):
+    return [field for field in required_fields if extracted_content.get(field) is None]
+
+required_fields = ("email", "name", "bio", "course_product")
+
+email_re = re.compile(r'[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,24}')
+# name [at] domain [dot] com, name (at) domain (dot) com, name{at}domain{dot}com
+obfuscated_email_re = re.compile(
+    r'([A-Za-z0-9._%+-]+)\s*[\[\(\{<]\s*at\s*[\]\)\}>]\s*([A-Za-z0-9-]+(?:\s*[\[\(\{<]\s*dot\s*[\]\)\}>]\s*[A-Za-z0-9-]+)+)',
+    re.IGNORECASE,
+)
+obfuscated_dot_re = re.compile(r'\s*[\[\(\{<]\s*dot\s*[\]\)\}>]\s*', re.IGNORECASE)
+# Addresses that show up on pages but never belong to the owner
+junk_email_re = re.compile(r'\.(?:png|jpe?g|gif|svg|webp)$|@(?:example\.|sentry|wixpress\.com|domain\.com|email\.com|yourdomain)|^(?:no-?reply|wordpress|privacy)@', re.IGNORECASE)
+social_re = re.compile(r'https?://(?:www\.)?(?:instagram\.com|pinterest\.[a-z.]+|facebook\.com|twitter\.com|x\.com|youtube\.com|tiktok\.com|linkedin\.com|threads\.net)/[^\s"\'<>]+', re.IGNORECASE)
+share_link_re = re.compile(r'sharer|/share|intent/|/pin/create|/dialog/|shareArticle', re.IGNORECASE)
+
+class ContactParser(HTMLParser):
+    """
+    Collects mailto links, social profile links, JSON-LD blocks and visible text in a single pass.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.mailtos = []
+        self.socials = []
+        self.json_ld = []
+        self.text = []
+        self._in_json_ld = False
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "a" and attrs.get("href"):
+            href = attrs["href"].strip()
+            if href.lower().startswith("mailto:"):
+                self.mailtos.append(unquote(href[7:].split("?")[0]))
+            elif social_re.match(href) and not share_link_re.search(href):
+                self.socials.append(href)
+        elif tag == "script":
+            if (attrs.get("type") or "").lower() == "application/ld+json":
+                self._in_json_ld = True
+                self.json_ld.append("")
+            else:
+                self._skip += 1
+        elif tag == "style":
+            self._skip += 1
+
+    def handle_endtag(self, tag):
+        if tag == "script" and self._in_json_ld:
+            self._in_json_ld = False
+        elif tag in ("script", "style") and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if self._in_json_ld:
+            self.json_ld[-1] += data
+        elif not self._skip:
+            self.text.append(data)
+
+def find_json_ld_people(node, people):
+    """
+    Walk a JSON-LD document and collect every Person, including authors and founders of other entities.
+    """
+    if isinstance(node, list):
+        for item in node:
+            find_json_ld_people(item, people)
+    elif isinstance(node, dict):
+        node_type = node.get("@type")
+        types = node_type if isinstance(node_type, list) else [node_type]
+        if "Person" in types:
+            people.append(node)
+        for key in ("@graph", "author", "founder", "creator", "mainEntity"):
+            if key in node:
+                find_json_ld_people(node[key], people)
+
+def pick_email(candidates, url):
+    emails = []
+    for email in candidates:
+        email = email.strip().strip(".").lower()
+        if email_re.fullmatch(email) and not junk_email_re.search(email) and email not in emails:
+            emails.append(email)
+    if not emails:
+        return None
+    # Prefer an address on the blog's own domain
+    host = (urlparse(url).hostname or "").removeprefix("www.")
+    for email in emails:
+        if host and email.split("@")[1].endswith(host):
+            return email
+    return emails[0]
+
+def extract_contact_heuristics(extracted_content, html_content, url):
+    """
+    Fill in the email, name and socials of extracted_content from mailto links, JSON-LD Person markup
+    and email addresses in the page text, without calling the LLM. Only empty fields are filled.
+    
+    Args:
+        extracted_content: Dict of the data extracted so far, updated in place
+        html_content: Raw html of the page
+        url: URL of the page
+    Returns:
+        extracted_content
+    """
+    parser = ContactParser()
+    try:
+        parser.feed(html_content)
+        parser.close()
+    except Exception as e:
+        print(f"Failed to parse {url} for contact data: {e}")
+    people = []
+    for block in parser.json_ld:
+        try:
+            find_json_ld_people(json.loads(block), people)
+        except ValueError:
+            continue
+    text = " ".join(parser.text)
+    candidates = list(parser.mailtos)
+    candidates += [person["email"].removeprefix("mailto:") for person in people if isinstance(person.get("email"), str)]
+    candidates += email_re.findall(text)
+    candidates += [f"{user}@{obfuscated_dot_re.sub('.', domain)}" for user, domain in obfuscated_email_re.findall(text)]
+    found = {"email": pick_email(candidates, url)}
+    for person in people:
+        if isinstance(person.get("name"), str) and person["name"].strip():
+            found["name"] = person["name"].strip()
+            if isinstance(person.get("description"), str) and person["description"].strip():
+                found["bio"] = person["description"].strip()
+            same_as = person.get("sameAs") or []
+            parser.socials += [same_as] if isinstance(same_as, str) else [link for link in same_as if isinstance(link, str)]
+            break
+    update_none_values(extracted_content, found)
+    socials = extracted_content.setdefault("socials", [])
+    for link in parser.socials:
+        if link not in socials:
+            socials.append(link)
+    return extracted_content
 
 
 def update_none_values(target_dict, source_dict):
@@ -146,6 +388,13 @@ def update_none_values(target_dict, source_dict):
     return target_dict
 
 
+field_descriptions = {
+    "email": "The email address of the owner",
+    "name": "The owners's name",
+    "bio": "The personal bio or information of the owner for personalization of the outreach",
+    "course_product": "The course or products they are selling",
+}
+
 def scrape_blog_data(extracted_content, page_content):
     
     class PageDataSchema(BaseModel):
@@ -157,30 +406,33 @@ def scrape_blog_data(extracted_content, page_content):
         bio:str|None
         course_product:str|None
    
+    # Fields already found (e.g. by the heuristics) aren't asked for again
+    missing = {field: None for field in missing_fields(extracted_content)}
+    missing_descriptions = "\n        ".join(
+        f"{index}. {field_descriptions[field]}" for index, field in enumerate(missing, start=1)
+    )
     is_data_on_page_prompt = f"""
         You are a data extraction bot. Your job is to extract data from the given page.
         You will be given the page content and you need to extract the that am looking for.
         The data I am looking for is:
-        1. The email address of the owner
-        2. The owners's name
-        3. The personal bio or information of the owner for personalization of the outreach
-        4. The course or products they are selling
+        {missing_descriptions}
         If you find any of this data on the page, please extract it and return it in the following format:
-        {extracted_content}
+        {missing}
         If you do not find a certain key data on the page, please return None for that specific field that you dont find.
         
     """
     # Extract data from the page using LLM
-    response = client.responses.parse(
+    response = llm.parse(
         model=ai_model,
         input=[
             {"role": "system", "content": is_data_on_page_prompt},
             {
                 "role": "user",
-                "content": f"{page_content}",
+                "content": f"{select_page_content(page_content)}",
             },
         ],
         text_format=PageDataSchema,
+        name="scrape_blog_data",
     )
     response_content = response.output_parsed
     extracted_content = update_none_values(extracted_content, response_content.dict())
@@ -188,26 +440,29 @@ def scrape_blog_data(extracted_content, page_content):
 
     
 
-def best_url_to_follow( links, extracted_content):
+def best_url_to_follow( links, extracted_content, anchors=None):
     """
     Given a list of links, determine which link is most likely to contain the required data.
     
     Args:
         links: List of links to evaluate
+        anchors: Optional dict of link to anchor text, used to rank the links
     """
     class URLToFollowSchema(BaseModel):
         """
         Represents the schema for the LLM response containing URL to follow for further extraction.
         """
         url:str
-    extracted_content_with_none_values = {key: value for key, value in extracted_content.items() if value is None}
+    extracted_content_with_none_values = {key: None for key in missing_fields(extracted_content)}
+    # Only the most promising links that fit the token budget are shown to the model
+    links = rank_links(links, anchors)
     which_url_to_follow_prompt = f"""
         You are a scraping bot and you are required to extract specific information from a page.
         Given the list of links, tell me which link should I navigate to that is most likely to contain the following information:
         extracted info: {extracted_content_with_none_values}
         links: {links}
     """
-    response = client.responses.parse(
+    response = llm.parse(
         model="gpt-4.1-nano",
         input=[
             {"role": "system", "content": which_url_to_follow_prompt},
@@ -217,6 +472,7 @@ def best_url_to_follow( links, extracted_content):
             },
         ],
         text_format=URLToFollowSchema,
+        name="best_url_to_follow",
     )
     # Extract the URL to follow from the response
     url_to_follow = response.output_parsed.url
@@ -233,24 +489,35 @@ def extract_blog_content_and_links(driver, href):
         # Extract the root domain from the href
     parsed_url = urlparse(href)
     root_domain = f"{parsed_url.scheme}://{parsed_url.netloc}"
-    try:
-        driver.set_page_load_timeout(60)
-        driver.get(root_domain)
-    except Exception as e:
-        raise Exception(f"Page took too long to load: {e}")
-    WebDriverWait(driver, 10).until(
-        EC.presence_of_element_located((By.TAG_NAME, "body"))
-    )
-    # Remove all script and head tags from the page source
-    page_source = driver.page_source
-    markdown_content = extract_markdown_from_html(page_source)
-    # Extract all links from the markdown content
-    links = re.findall(r'\[.*?\]\((http[s]?://.*?)\)', markdown_content)
-    links = [link for link in links if not re.search(r'\.(?:jpg|jpeg|png|gif|bmp|svg)(?:\?.*)?$', link, re.IGNORECASE)]
+    # Same-domain links are collected by the extractor in the same pass as the markdown
+    _, page = load_page(driver, root_domain)
+    return page.markdown, page.links
 
-    # Filter links that contain the root domain
-    filtered_links = [link for link in links if root_domain in link]
-    return markdown_content,filtered_links
+def load_page(driver, url):
+    """
+    Return the html and the extracted markdown and links of a page, going through the page cache.
+    
+    Args:
+        driver: WebDriver instance used when the page has to be rendered
+        url: URL of the page
+    Returns:
+        Tuple of (html, PageExtract)
+    """
+    cached = page_cache.get(url)
+    if cached and cached["html"] is not None and cached["markdown"] is not None and cached["links"] is not None:
+        metrics.incr("page_cache_total", result="hit")
+        return cached["html"], PageExtract(cached["markdown"], [link for link, _ in cached["links"]], dict(cached["links"]))
+    metrics.incr("page_cache_total", result="partial" if cached and cached["html"] is not None else "miss")
+    html_content = cached["html"] if cached and cached["html"] is not None else fetch_page(driver, url)
+    with metrics.timed("convert"):
+        page = extract_page(html_content, url)
+    page_cache.put(
+        url,
+        html=None if cached and cached["html"] is not None else html_content,
+        markdown=page.markdown,
+        links=[[link, page.anchors[link]] for link in page.links],
+    )
+    return html_content, page
 
 def extract_markdown_from_html(html_content):
     """
@@ -262,31 +529,15 @@ def extract_markdown_from_html(html_content):
     Returns:
         Extracted markdown content
     """
-    # Remove all <head>, <script>, and <img> tags from the page source
-    markdown_content = re.sub(r'<(head|script|img)[^>]*>.*?</\1>', '', html_content, flags=re.DOTALL)
-    # Remove all base64 URLs from the page source
-    markdown_content = re.sub(r'data:image/[^;]+;base64,[^\"]+', '', markdown_content)
-    # Remove all <a> tags that have hrefs pointing to image URLs
-    markdown_content = re.sub(r'<a[^>]*href=["\'].*?\.(?:jpg|jpeg|png|gif|bmp|svg)["\'][^>]*>.*?</a>', '', markdown_content, flags=re.DOTALL | re.IGNORECASE)
-    return md(markdown_content)
+    return extract_page(html_content).markdown
 
 def send_results_to_crm(body):
     """
-    Send results to CRM system
+    Queue results for the CRM, they are delivered in the background by the outbox
     Args:
         body: The data to be sent
+    Returns:
+        True if the data is waiting for delivery, False if it was already sent or is a dead letter
     """
-    url = os.getenv("CRM_URL")
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {os.getenv('CRM_TOKEN')}"  # Replace with your API token if required
-    }
-
-    try:
-        response = requests.post(url, json=body, headers=headers)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-        print(f"Results successfully sent to CRM: {response.status_code}")
-    except requests.exceptions.RequestException as e:
-        print(f"Failed to send results to CRM: {e}")
-    pass
+    return crm_outbox.enqueue(body)
 
@@ -0,0 +1,34 @@
+import asyncio
+import threading
+
+_loop = None
+_lock = threading.Lock()
+
+
+def get_loop():
+    """
+    Return the shared background event loop, starting it on first use.
+    Async clients (HTTP, OpenAI) live on this loop so the threaded pipeline can share their connection pools.
+    """
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, daemon=True, name="aio-loop").start()
+        return _loop
+
+
+def run(coro, timeout=None):
+    """
+    Run a coroutine on the background loop and block until it finishes.
+
+    Args:
+        coro: Coroutine to run
+        timeout: Maximum time in seconds to wait for the result
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, get_loop())
+    try:
+        return future.result(timeout)
+    except TimeoutError:
+        future.cancel()
+        raise
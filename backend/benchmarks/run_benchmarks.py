@@ -0,0 +1,256 @@
+"""
+Offline benchmark of the enrichment pipeline against the fixture corpus, five hand-written blogs
+modelled on typical Pinterest blogs rather than recordings of real sites.
+
+Serves the fixtures with the mock SERP server, answers every LLM call with a stub client and
+reports pages/sec, latency percentiles per stage, peak memory and LLM calls and tokens per domain.
+
+    python benchmarks/run_benchmarks.py                    # run and compare with benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --save-baseline    # run and record a new baseline
+
+Exits with status 1 when LLM usage or found leads got worse than the baseline. Those are deterministic with
+the stub client. Throughput and memory depend on the machine and are only reported next to the baseline.
+"""
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+import urllib.request
+import json
+import glob
+import time
+import sys
+import os
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Every run starts from empty caches and never talks to the CRM, set before the backend modules read them
+os.environ["CACHE_DIR"] = tempfile.mkdtemp(prefix="frank-bench-")
+os.environ["LLM_CACHE_ENABLED"] = "0"
+os.environ.pop("CRM_URL", None)
+os.environ.pop("CRM_BATCH_URL", None)
+
+from mock_serp_server import start_mock_server, FIXTURES_DIR
+from stub_llm import StubLLMClient
+from metrics import metrics
+from llm import llm
+from page_cache import page_cache
+from url_filter import prefilter_blog_urls
+from ai import extract_markdown_from_html, extract_blog_content_and_links, filter_irrelavant_urls, extract_blog_data_recursively
+from pipeline import root_url
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+# Mock servers get new ports every run, which moves token counts of prompts holding URLs a little
+TOKEN_TOLERANCE = 0.02
+
+
+class FixtureDriver:
+    """
+    Minimal stand-in for the Selenium driver: loads pages over plain HTTP without running JavaScript.
+    """
+    def __init__(self):
+        self.page_source = ""
+
+    def set_page_load_timeout(self, seconds):
+        self.timeout = seconds
+
+    def get(self, url):
+        with urllib.request.urlopen(url, timeout=self.timeout) as response:
+            self.page_source = response.read().decode("utf-8", errors="replace")
+
+    def find_element(self, by, value):
+        return self
+
+    def execute_script(self, script, *args):
+        if "readyState" in script:
+            return "complete"
+        if "innerText" in script:
+            return len(self.page_source)
+        return None
+
+
+def percentiles(samples):
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    cuts = statistics.quantiles(ordered, n=100, method="inclusive") if len(ordered) > 1 else [ordered[0]] * 99
+    return {
+        "count": len(ordered),
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p90_ms": round(cuts[89] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def measure(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def fixture_pages(blog_urls):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "blogs", "*", "**", "*.html"), recursive=True)):
+        blog = os.path.relpath(path, os.path.join(FIXTURES_DIR, "blogs")).split(os.sep)[0]
+        with open(path, encoding="utf-8") as f:
+            pages.append(f.read().replace("{{base}}", blog_urls[blog]))
+    return pages
+
+
+def bench_conversion(pages, rounds):
+    samples = []
+    tracemalloc.start()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for html in pages:
+            samples.append(measure(extract_markdown_from_html, html)[1])
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "pages": len(samples),
+        "pages_per_sec": round(len(samples) / elapsed, 1),
+        "latency": percentiles(samples),
+        "peak_memory_kb": peak // 1024,
+    }
+
+
+def bench_url_filter(mock, rounds):
+    serp_urls = [url + "/" for url in mock.blog_urls.values()]
+    with open(os.path.join(FIXTURES_DIR, "serp", "noise.txt"), encoding="utf-8") as f:
+        serp_urls += [line.split("|", 1)[0] for line in f if line.strip() and not line.startswith("#")]
+    samples = []
+    for _ in range(rounds):
+        samples.append(measure(prefilter_blog_urls, serp_urls)[1])
+    return {"urls": len(serp_urls), "latency": percentiles(samples)}
+
+
+def bench_domains(mock, driver):
+    """
+    Run every fixture blog through extract_blog_content_and_links, filter_irrelavant_urls and
+    extract_blog_data_recursively, the same steps pipeline.process_domain takes.
+    """
+    stages = {"content_and_links": [], "filter_urls": [], "extract_data": [], "domain": []}
+    domains = {}
+    tracemalloc.start()
+    started = time.perf_counter()
+    for name, base_url in mock.blog_urls.items():
+        with metrics.trace() as trace:
+            domain_started = time.perf_counter()
+            try:
+                (_, links), seconds = measure(extract_blog_content_and_links, driver, base_url + "/")
+                stages["content_and_links"].append(seconds)
+                relevant, seconds = measure(filter_irrelavant_urls, links)
+                stages["filter_urls"].append(seconds)
+                data = {}
+                if relevant:
+                    data, seconds = measure(lambda: extract_blog_data_recursively(driver, relevant, home_url=root_url(base_url)))
+                    stages["extract_data"].append(seconds)
+                error = None
+            except Exception as e:
+                data, error = {}, str(e)
+            stages["domain"].append(time.perf_counter() - domain_started)
+        summary = trace.summary()
+        counters = summary["counters"]
+        domains[name] = {
+            "email": data.get("email"),
+            "name": data.get("name"),
+            "error": error,
+            "llm_calls": sum(value for key, value in counters.items() if key.startswith("llm_calls_total.")),
+            "llm_tokens": sum(value for key, value in counters.items() if key.startswith("llm_tokens_total.")),
+            "pages_fetched": sum(value for key, value in counters.items() if key in ("pages_fetched_total.http", "pages_fetched_total.browser")),
+            "stages": {stage: stats["seconds"] for stage, stats in summary["stages"].items()},
+        }
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    pages = sum(domain["pages_fetched"] for domain in domains.values())
+    return {
+        "domains": len(domains),
+        "pages": pages,
+        "pages_per_sec": round(pages / elapsed, 1),
+        "leads": len([domain for domain in domains.values() if domain["email"]]),
+        "llm_calls_per_domain": round(sum(domain["llm_calls"] for domain in domains.values()) / len(domains), 2),
+        "llm_tokens_per_domain": round(sum(domain["llm_tokens"] for domain in domains.values()) / len(domains), 1),
+        "latency": {stage: percentiles(samples) for stage, samples in stages.items()},
+        "peak_memory_kb": peak // 1024,
+        "per_domain": domains,
+    }
+
+
+def run(rounds, llm_latency):
+    llm.set_client(StubLLMClient(latency=llm_latency))
+    mock = start_mock_server()
+    try:
+        page_cache.clear()
+        results = {
+            "conversion": bench_conversion(fixture_pages(mock.blog_urls), rounds),
+            "url_filter": bench_url_filter(mock, rounds),
+            "domains": bench_domains(mock, FixtureDriver()),
+        }
+    finally:
+        mock.close()
+    return results
+
+
+def compare(results, baseline):
+    """
+    Return a list of human readable regressions of results against baseline.
+    Only LLM usage and found leads are compared, they are deterministic with the stub and must not get worse.
+    """
+    regressions = []
+    old, new = baseline["domains"], results["domains"]
+    if new["llm_calls_per_domain"] > old["llm_calls_per_domain"]:
+        regressions.append(f"domains: {new['llm_calls_per_domain']} LLM calls per domain, baseline {old['llm_calls_per_domain']}")
+    if new["llm_tokens_per_domain"] > old["llm_tokens_per_domain"] * (1 + TOKEN_TOLERANCE):
+        regressions.append(f"domains: {new['llm_tokens_per_domain']} LLM tokens per domain, baseline {old['llm_tokens_per_domain']}")
+    if new["leads"] < old["leads"]:
+        regressions.append(f"domains: {new['leads']} leads found, baseline {old['leads']}")
+    return regressions
+
+
+def performance_report(results, baseline):
+    """
+    Return throughput and memory next to the baseline, for information only since they vary between machines.
+    """
+    lines = []
+    for bench in ("conversion", "domains"):
+        old, new = baseline[bench], results[bench]
+        lines.append(f"{bench}: {new['pages_per_sec']} pages/sec (baseline {old['pages_per_sec']}), "
+                     f"peak memory {new['peak_memory_kb']} KB (baseline {old['peak_memory_kb']} KB)")
+    return lines
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the enrichment pipeline on the fixture corpus")
+    parser.add_argument("--rounds", type=int, default=20, help="Repetitions of the conversion and URL filter benchmarks")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Simulated seconds per LLM call")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Record this run as the new baseline")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = run(args.rounds, args.llm_latency)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        sys.exit(0)
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save-baseline first")
+        sys.exit(0)
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    for line in performance_report(results, baseline):
+        print(line)
+    regressions = compare(results, baseline)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    sys.exit(1 if regressions else 0)
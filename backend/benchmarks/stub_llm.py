@@ -0,0 +1,79 @@
+import asyncio
+import ast
+import json
+import re
+
+from llm import prompt_tokens
+
+URL_RE = re.compile(r'https?://[^\s\'",\]]+')
+# The stub keeps the links a reasonable model would keep when looking for owner details
+RELEVANT_URL_RE = re.compile(r'about|contact|hello|hire|shop|store|course|work-with-me', re.IGNORECASE)
+PRODUCT_RE = re.compile(r'course|shop|store|ebook|template|masterclass|coaching', re.IGNORECASE)
+
+
+class StubUsage:
+    def __init__(self, input_tokens, output_tokens):
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+
+
+class StubResponse:
+    def __init__(self, output_parsed, input_tokens, output_tokens):
+        self.output_parsed = output_parsed
+        self.usage = StubUsage(input_tokens, output_tokens)
+
+
+class StubLLMClient:
+    """
+    Stands in for AsyncOpenAI in benchmarks: answers responses.parse deterministically from the prompt
+    so runs are reproducible and free, install it with llm.set_client(StubLLMClient()).
+
+    Args:
+        latency: Seconds every call takes, to model the network round trip
+    """
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.responses = self
+        self.calls = 0
+
+    async def parse(self, model, input, text_format):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        content = input[-1]["content"] if isinstance(input, list) else input
+        fields = set(text_format.model_fields)
+        if "groups" in fields:
+            groups = ast.literal_eval(content)
+            data = {"groups": [{"group": group, "data": relevant_urls(urls)} for group, urls in groups.items()]}
+        elif fields == {"data"}:
+            urls = URL_RE.findall(content)
+            # The blog classification keeps every candidate, link filtering keeps the promising ones
+            data = {"data": relevant_urls(urls) if "personal blogs" not in str(input[0]["content"]) else urls}
+        elif fields == {"url"}:
+            urls = URL_RE.findall(input[0]["content"])
+            data = {"url": urls[0] if urls else ""}
+        else:
+            data = page_data(content, fields)
+        output = text_format.model_validate(data)
+        return StubResponse(output, prompt_tokens(input), len(json.dumps(data)) // 4 + 1)
+
+
+def relevant_urls(urls):
+    return [url for url in urls if RELEVANT_URL_RE.search(url)]
+
+
+def page_data(markdown, fields):
+    """
+    Fill the requested fields from the page the way a careful model would: nothing is made up,
+    the bio is the first paragraph and the product the first line mentioning one.
+    """
+    lines = [line.strip() for line in markdown.split("\n") if line.strip()]
+    paragraphs = [line for line in lines if not line.startswith(("#", "-", "[")) and len(line) > 60]
+    # Lines made of links only are navigation, not a product description
+    products = [line for line in lines if PRODUCT_RE.search(line) and not line.startswith("[")]
+    data = {field: None for field in fields}
+    if "bio" in data and paragraphs:
+        data["bio"] = paragraphs[0][:300]
+    if "course_product" in data and products:
+        data["course_product"] = products[0][:200]
+    return data
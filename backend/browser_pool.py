@@ -0,0 +1,488 @@
+from contextlib import contextmanager
+from selenium.common.exceptions import WebDriverException
+from seleniumbase import Driver
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+import threading
+import signal
+import queue
+import time
+import os
+
+from metrics import metrics
+
+load_dotenv()
+BROWSER_POOL_SIZE = int(os.getenv('BROWSER_POOL_SIZE', 4))
+BROWSER_MAX_PAGE_LOADS = int(os.getenv('BROWSER_MAX_PAGE_LOADS', 200))
+BROWSER_LEASE_TIMEOUT = int(os.getenv('BROWSER_LEASE_TIMEOUT', 300))
+BROWSER_FETCH_PROFILE = os.getenv('BROWSER_FETCH_PROFILE', 'lean')
+# Extra comma separated URL patterns to block, e.g. *.example-cdn.com*
+BROWSER_BLOCKED_URLS = [pattern.strip() for pattern in os.getenv('BROWSER_BLOCKED_URLS', '').split(',') if pattern.strip()]
+# A driver whose Chrome processes use more memory or processes than this is recycled
+BROWSER_MAX_RSS_MB = int(os.getenv('BROWSER_MAX_RSS_MB', 1024))
+BROWSER_MAX_PROCESSES = int(os.getenv('BROWSER_MAX_PROCESSES', 40))
+BROWSER_WATCHDOG_INTERVAL = float(os.getenv('BROWSER_WATCHDOG_INTERVAL', 15))
+
+
+def extension_patterns(extensions):
+    # Blocked URL patterns only know *, so the extension is anchored to the end of the path or to the query
+    return [pattern for ext in extensions for pattern in (f"*.{ext}", f"*.{ext}?*")]
+
+
+def tracker_patterns(entry):
+    """
+    Patterns matching a tracker host and its subdomains, and only the given path when the entry has one,
+    so e.g. segment.com does not block thesegment.company.
+    """
+    host, _, path = entry.partition("/")
+    hosts = (f"*://{host}", f"*://*.{host}")
+    if not path:
+        return [f"{host_pattern}/*" for host_pattern in hosts]
+    return [f"{host_pattern}/{path}{suffix}" for host_pattern in hosts for suffix in ("", "/*", "?*")]
+
+
+IMAGE_PATTERNS = extension_patterns(("jpg", "jpeg", "png", "gif", "webp", "avif", "svg", "ico", "bmp"))
+MEDIA_PATTERNS = extension_patterns(("mp4", "webm", "m3u8", "mp3", "ogg", "wav", "mov"))
+FONT_PATTERNS = extension_patterns(("woff", "woff2", "ttf", "otf", "eot"))
+TRACKER_PATTERNS = [pattern for entry in (
+    "google-analytics.com", "googletagmanager.com", "googlesyndication.com", "doubleclick.net",
+    "adservice.google.com", "connect.facebook.net", "facebook.com/tr", "hotjar.com", "clarity.ms",
+    "segment.com", "segment.io", "amazon-adsystem.com", "taboola.com", "outbrain.com", "quantserve.com",
+    "scorecardresearch.com", "adnxs.com", "criteo.com", "pinimg.com/ct", "ct.pinterest.com", "mediavine.com",
+    "adthrive.com", "ezoic.net", "newrelic.com", "nr-data.net", "intercom.io", "disqus.com",
+) for pattern in tracker_patterns(entry)]
+
+
+class FetchProfile:
+    """
+    Which resources a browser loads. We only ever read page_source, so the lean profile
+    skips images, media, fonts and trackers and returns as soon as the DOM is parsed.
+
+    Args:
+        block_images: Block image requests
+        block_media: Block audio and video requests
+        block_fonts: Block web fonts
+        block_trackers: Block known analytics and ad domains
+        page_load_strategy: Selenium page load strategy, eager returns at DOMContentLoaded
+        blocked_urls: Extra URL patterns to block
+    """
+    def __init__(self, block_images=True, block_media=True, block_fonts=True, block_trackers=True,
+                 page_load_strategy="eager", blocked_urls=()):
+        self.block_images = block_images
+        self.block_media = block_media
+        self.block_fonts = block_fonts
+        self.block_trackers = block_trackers
+        self.page_load_strategy = page_load_strategy
+        self.blocked_urls = list(blocked_urls)
+
+    def blocked_patterns(self):
+        patterns = list(self.blocked_urls)
+        if self.block_images:
+            patterns += IMAGE_PATTERNS
+        if self.block_media:
+            patterns += MEDIA_PATTERNS
+        if self.block_fonts:
+            patterns += FONT_PATTERNS
+        if self.block_trackers:
+            patterns += TRACKER_PATTERNS
+        return patterns
+
+
+fetch_profiles = {
+    "lean": FetchProfile(blocked_urls=BROWSER_BLOCKED_URLS),
+    "full": FetchProfile(False, False, False, False, page_load_strategy="normal", blocked_urls=BROWSER_BLOCKED_URLS),
+}
+
+
+def create_driver(profile=None):
+    """
+    Start a new headless undetected Chrome driver using a fetch profile.
+
+    Args:
+        profile: FetchProfile, defaults to the one named by BROWSER_FETCH_PROFILE
+    """
+    profile = profile or fetch_profiles[BROWSER_FETCH_PROFILE]
+    driver = Driver(uc=True, headless=True, block_images=profile.block_images, page_load_strategy=profile.page_load_strategy)
+    apply_fetch_profile(driver, profile)
+    return driver
+
+
+def apply_fetch_profile(driver, profile):
+    patterns = profile.blocked_patterns()
+    if not patterns:
+        return
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+    except Exception as e:
+        # Still usable, it just loads everything
+        print(f"Failed to block resources in the browser: {e}")
+
+
+def driver_pids(driver):
+    """
+    Return the pids of chromedriver and Chrome for a driver, the root processes of its tree.
+    """
+    pids = []
+    process = getattr(getattr(driver, "service", None), "process", None)
+    if process is not None and process.pid:
+        pids.append(process.pid)
+    # Undetected Chrome starts the browser detached from chromedriver
+    if getattr(driver, "browser_pid", None):
+        pids.append(driver.browser_pid)
+    return pids
+
+
+def process_tree(root_pids):
+    """
+    Return the root pids and all their descendants that are still running, read from /proc.
+    Empty when /proc isn't available.
+    """
+    children = {}
+    try:
+        entries = [entry for entry in os.listdir("/proc") if entry.isdigit()]
+    except OSError:
+        return set()
+    for entry in entries:
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name can contain spaces, the fields after it are fixed
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree = set()
+    stack = [pid for pid in root_pids if os.path.exists(f"/proc/{pid}")]
+    while stack:
+        pid = stack.pop()
+        if pid in tree:
+            continue
+        tree.add(pid)
+        stack.extend(children.get(pid, []))
+    return tree
+
+
+def rss_mb(pids):
+    total_kb = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except (OSError, ValueError):
+            continue
+    return total_kb / 1024
+
+
+def kill_processes(pids):
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+class PooledDriver:
+    """
+    Wraps a WebDriver and counts page loads so the pool knows when to recycle it.
+    Also records the origins it visited so their storage can be cleared between leases.
+    Every other attribute is forwarded to the underlying driver.
+    """
+    def __init__(self, driver):
+        self._driver = driver
+        self.page_loads = 0
+        self.origins = set()
+        self.broken = False
+        self.over_limit = None
+        self.root_pids = driver_pids(driver)
+
+    def resource_usage(self):
+        pids = process_tree(self.root_pids)
+        return {"processes": len(pids), "rss_mb": round(rss_mb(pids), 1)}
+
+    def get(self, url):
+        self.page_loads += 1
+        self._visited(url)
+        try:
+            return self._driver.get(url)
+        except WebDriverException as e:
+            if is_crash(e):
+                self.broken = True
+            raise
+        finally:
+            # Redirects can end on another origin, e.g. http to https or a www host
+            if not self.broken:
+                try:
+                    self._visited(self._driver.current_url)
+                except WebDriverException:
+                    pass
+
+    def _visited(self, url):
+        origin = origin_of(url)
+        if origin is not None:
+            self.origins.add(origin)
+
+    def __getattr__(self, name):
+        return getattr(self._driver, name)
+
+
+def origin_of(url):
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https"):
+        return None
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+def is_crash(error):
+    message = str(error).lower()
+    return any(marker in message for marker in ("session deleted", "invalid session id", "chrome not reachable", "disconnected", "crashed"))
+
+
+class BrowserPool:
+    """
+    Keeps a fixed number of warm Chrome drivers and leases them out.
+    A driver is recycled after max_page_loads page loads, when it fails a health check or when it crashed.
+
+    Args:
+        size: Maximum number of drivers alive at the same time
+        max_page_loads: Number of page loads after which a driver is restarted
+        driver_factory: Callable returning a new WebDriver
+        max_rss_mb: Memory of a driver's processes above which it is recycled
+        max_processes: Number of a driver's processes above which it is recycled
+    """
+    def __init__(self, size=BROWSER_POOL_SIZE, max_page_loads=BROWSER_MAX_PAGE_LOADS, driver_factory=create_driver,
+                 max_rss_mb=BROWSER_MAX_RSS_MB, max_processes=BROWSER_MAX_PROCESSES):
+        self.size = size
+        self.max_page_loads = max_page_loads
+        self.driver_factory = driver_factory
+        self.max_rss_mb = max_rss_mb
+        self.max_processes = max_processes
+        self.idle = queue.LifoQueue()
+        # Every driver alive, idle or leased, for the watchdog
+        self.drivers = set()
+        self._watchdog = None
+        # One slot per driver that can be leased at the same time
+        self.slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {"created": 0, "recycled": 0, "leases": 0, "over_limit": 0, "killed_processes": 0}
+
+    def warm_up(self, count=None):
+        """
+        Start drivers ahead of time in a background thread so the first leases don't pay the startup cost.
+        """
+        def start():
+            for _ in range(count or self.size):
+                if not self.slots.acquire(blocking=False):
+                    break
+                if self.alive() >= self.size:
+                    self.slots.release()
+                    break
+                try:
+                    self.idle.put(self._new_driver())
+                except Exception as e:
+                    print(f"Failed to warm up browser: {e}")
+                finally:
+                    self.slots.release()
+        threading.Thread(target=start, daemon=True, name="browser-warmup").start()
+
+    @contextmanager
+    def lease(self, timeout=BROWSER_LEASE_TIMEOUT):
+        """
+        Lease a healthy driver for the duration of the with block.
+
+        Args:
+            timeout: Maximum time in seconds to wait for a free driver
+        """
+        if not self.slots.acquire(timeout=timeout):
+            raise TimeoutError("Timed out waiting for a free browser")
+        driver = None
+        try:
+            driver = self._checkout()
+            yield driver
+        except WebDriverException as e:
+            if driver and is_crash(e):
+                driver.broken = True
+            raise
+        finally:
+            if driver:
+                self._checkin(driver)
+            self.slots.release()
+
+    @contextmanager
+    def lazy_lease(self, timeout=BROWSER_LEASE_TIMEOUT):
+        """
+        Like lease, but only takes a driver from the pool the first time it is used.
+        """
+        lazy = LazyDriver(self, timeout)
+        try:
+            yield lazy
+        finally:
+            lazy.release()
+
+    def start_watchdog(self, interval=BROWSER_WATCHDOG_INTERVAL):
+        """
+        Check the memory and process count of every driver in the background.
+        A driver over a limit is flagged and recycled when it is next checked in or out.
+        """
+        def watch():
+            while not self._closed:
+                time.sleep(interval)
+                for driver in self.check_resources():
+                    print(f"Browser over its limit ({driver.over_limit}), recycling it")
+        with self._lock:
+            if self._watchdog is not None:
+                return
+            self._watchdog = threading.Thread(target=watch, daemon=True, name="browser-watchdog")
+        self._watchdog.start()
+
+    def check_resources(self):
+        """
+        Flag the drivers over the memory or process limit, returns the newly flagged ones.
+        """
+        with self._lock:
+            drivers = list(self.drivers)
+        flagged = []
+        for driver in drivers:
+            if driver.over_limit:
+                continue
+            usage = driver.resource_usage()
+            if usage["rss_mb"] > self.max_rss_mb:
+                driver.over_limit = f"{usage['rss_mb']} MB"
+            elif usage["processes"] > self.max_processes:
+                driver.over_limit = f"{usage['processes']} processes"
+            else:
+                continue
+            with self._lock:
+                self.stats["over_limit"] += 1
+            metrics.incr("browser_over_limit_total")
+            flagged.append(driver)
+        return flagged
+
+    def resource_usage(self):
+        with self._lock:
+            drivers = list(self.drivers)
+        usages = [driver.resource_usage() for driver in drivers]
+        return {
+            "drivers": len(usages),
+            "processes": sum(usage["processes"] for usage in usages),
+            "rss_mb": round(sum(usage["rss_mb"] for usage in usages), 1),
+        }
+
+    def alive(self):
+        with self._lock:
+            return self.stats["created"] - self.stats["recycled"]
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                driver = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            self._quit(driver)
+
+    def _checkout(self):
+        with self._lock:
+            self.stats["leases"] += 1
+        while True:
+            try:
+                driver = self.idle.get_nowait()
+            except queue.Empty:
+                return self._new_driver()
+            if self._healthy(driver):
+                return driver
+            self._recycle(driver)
+
+    def _checkin(self, driver):
+        if self._closed or driver.broken or driver.over_limit or driver.page_loads >= self.max_page_loads:
+            self._recycle(driver)
+            return
+        try:
+            reset_driver_state(driver)
+        except Exception as e:
+            print(f"Failed to reset browser state, recycling: {e}")
+            self._recycle(driver)
+            return
+        self.idle.put(driver)
+
+    def _new_driver(self):
+        driver = PooledDriver(self.driver_factory())
+        with self._lock:
+            self.stats["created"] += 1
+            self.drivers.add(driver)
+        return driver
+
+    def _recycle(self, driver):
+        with self._lock:
+            self.stats["recycled"] += 1
+            self.drivers.discard(driver)
+        self._quit(driver)
+
+    def _healthy(self, driver):
+        if driver.broken or driver.over_limit:
+            return False
+        try:
+            driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def _quit(self, driver):
+        pids = process_tree(getattr(driver, "root_pids", []))
+        try:
+            driver.quit()
+        except Exception as e:
+            print(f"Failed to quit browser: {e}")
+        # Chrome helpers that outlive quit() would pile up over recycles
+        leftover = pids & process_tree(pids)
+        if leftover:
+            kill_processes(leftover)
+            with self._lock:
+                self.stats["killed_processes"] += len(leftover)
+
+
+class LazyDriver:
+    """
+    Driver handle that leases from the pool on first attribute access.
+    """
+    def __init__(self, pool, timeout):
+        self._pool = pool
+        self._timeout = timeout
+        self._lease = None
+        self._driver = None
+
+    def __getattr__(self, name):
+        if self._driver is None:
+            self._lease = self._pool.lease(self._timeout)
+            self._driver = self._lease.__enter__()
+        return getattr(self._driver, name)
+
+    def release(self):
+        if self._lease is not None:
+            self._lease.__exit__(None, None, None)
+            self._lease = None
+            self._driver = None
+
+
+def reset_driver_state(driver):
+    """
+    Clear cookies and storage of every site visited so the next lease starts from a clean browser.
+    """
+    # delete_all_cookies and localStorage.clear() only reach the current origin
+    driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+    driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+    # Storage.clearDataForOrigin takes one real origin, it has no wildcard
+    for origin in driver.origins:
+        driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+    driver.origins.clear()
+    driver.execute_script("try { window.sessionStorage.clear(); } catch (e) {}")
+    driver.get("about:blank")
+    # about:blank is not a real page load
+    driver.page_loads -= 1
+
+
+browser_pool = BrowserPool()
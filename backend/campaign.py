@@ -0,0 +1,235 @@
+from dotenv import load_dotenv
+import argparse
+import hashlib
+import threading
+import json
+import time
+import uuid
+import os
+
+from jobs import JobQueue, MAX_CONCURRENT_JOBS
+from pipeline import run_keyword
+from keywords import pinterest_titles
+from crm_outbox import crm_outbox
+
+load_dotenv()
+CAMPAIGN_DIR = os.getenv('CAMPAIGN_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'campaigns'))
+CAMPAIGN_WORKERS = int(os.getenv('CAMPAIGN_WORKERS', MAX_CONCURRENT_JOBS))
+
+
+def load_keywords(path):
+    """
+    Read one keyword per line, blank lines and lines starting with # are ignored.
+    """
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
+
+
+def campaign_id_for(keywords):
+    # The same keyword list maps to the same checkpoint, so running it again resumes it
+    return hashlib.sha1("\n".join(keywords).encode("utf-8")).hexdigest()[:12]
+
+
+class Campaign:
+    """
+    Runs a list of keywords through the pipeline, at most workers of them at the same time.
+    Domains are deduplicated across the whole campaign so a blog surfaced by several keywords is crawled once,
+    and progress is checkpointed to a JSON file after every keyword so an interrupted campaign resumes where it stopped.
+
+    Args:
+        keywords: List of keywords, duplicates are dropped
+        workers: Number of keywords running at the same time
+        checkpoint_path: JSON checkpoint file, defaults to CAMPAIGN_DIR/<campaign id>.json
+        job_queue: Shared JobQueue to run the keywords on, so they count against its worker limit.
+            A queue of its own is created when omitted
+    """
+    def __init__(self, keywords, workers=CAMPAIGN_WORKERS, checkpoint_path=None, job_queue=None):
+        self.keywords = list(dict.fromkeys(keyword.strip() for keyword in keywords if keyword.strip()))
+        self.id = campaign_id_for(self.keywords)
+        self.workers = workers
+        self.checkpoint_path = checkpoint_path or os.path.join(CAMPAIGN_DIR, f"{self.id}.json")
+        self.status = "created"
+        # keyword -> summary of its finished run
+        self.completed = {}
+        # normalized domain -> keyword that claimed it
+        self.domains = {}
+        self.elapsed_before = 0.0
+        self.started_at = None
+        self.finished_at = None
+        self.jobs = {}
+        self.job_queue = job_queue
+        self._owns_queue = job_queue is None
+        # Pending keywords not handed to the job queue yet
+        self._queued = []
+        self._finished = threading.Event()
+        self._lock = threading.Lock()
+        self._load_checkpoint()
+
+    def _load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return
+        with open(self.checkpoint_path, encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        # Failed keywords are retried, their domains are released again
+        self.completed = {keyword: summary for keyword, summary in checkpoint.get("completed", {}).items() if summary["status"] == "done"}
+        self.domains = {domain: keyword for domain, keyword in checkpoint.get("domains", {}).items() if keyword in self.completed}
+        self.elapsed_before = checkpoint.get("elapsed", 0.0)
+        print(f"Resuming campaign {self.id}: {len(self.completed)}/{len(self.keywords)} keywords done")
+
+    def _save_checkpoint(self):
+        checkpoint = {
+            "campaign_id": self.id,
+            "keywords": self.keywords,
+            "completed": self.completed,
+            "domains": {domain: keyword for domain, keyword in self.domains.items() if keyword in self.completed},
+            "elapsed": self.elapsed(),
+            "saved_at": time.time(),
+        }
+        os.makedirs(os.path.dirname(self.checkpoint_path) or ".", exist_ok=True)
+        # Write then rename so an interrupted write never leaves a truncated checkpoint behind
+        tmp_path = f"{self.checkpoint_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f, indent=2)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def pending(self):
+        return [keyword for keyword in self.keywords if keyword not in self.completed]
+
+    def claim(self, domain, keyword):
+        """
+        Return True if keyword may handle the domain, False if another keyword already claimed it.
+        """
+        with self._lock:
+            owner = self.domains.setdefault(domain, keyword)
+            return owner == keyword
+
+    def start(self):
+        """
+        Queue every pending keyword and return immediately, see wait() and report().
+        """
+        pending = self.pending()
+        self.status = "running"
+        self.started_at = time.time()
+        if not pending:
+            self.status = "done"
+            self.finished_at = self.started_at
+            self._finished.set()
+            return self
+        print(f"Campaign {self.id}: {len(pending)} keywords queued on {self.workers} workers")
+        if self.job_queue is None:
+            self.job_queue = JobQueue(self._run_job, max_workers=self.workers)
+        with self._lock:
+            self._queued = pending
+            # Only workers keywords are handed over at a time, so a campaign doesn't crowd out other jobs
+            for _ in range(min(self.workers, len(pending))):
+                self._submit_next()
+        return self
+
+    def _submit_next(self):
+        keyword = self._queued.pop(0)
+        self.jobs[keyword] = self.job_queue.submit(keyword, runner=self._run_job, on_finish=self._record)
+
+    def _run_job(self, job):
+        run_keyword(job, claim_domain=lambda domain: self.claim(domain, job.keyword))
+
+    def _record(self, job):
+        with self._lock:
+            if job.status == "done":
+                data = job.to_dict(include_results=True)
+                self.completed[job.keyword] = {
+                    "status": job.status,
+                    "progress": data["progress"],
+                    "leads": [post.get("website") for post in data["posts"]],
+                    "seconds": round(job.finished_at - job.started_at, 2),
+                }
+            else:
+                # Let the domains of a failed keyword be picked up by the others or a resumed run
+                for domain in [domain for domain, keyword in self.domains.items() if keyword == job.keyword]:
+                    del self.domains[domain]
+            self._save_checkpoint()
+            if self._queued and self.status == "running":
+                self._submit_next()
+            elif not self._queued and all(self.jobs[keyword].finished_at for keyword in self.jobs):
+                if self.status == "running":
+                    self.status = "done"
+                self.finished_at = time.time()
+                self._finished.set()
+        report = self.report()
+        print(f"Campaign {self.id}: finished '{job.keyword}' ({job.status}), "
+              f"{report['keywords_done']}/{report['keywords_total']} keywords, "
+              f"{report['keywords_per_hour']} keywords/h, {report['domains_per_hour']} domains/h")
+
+    def wait(self, timeout=None):
+        """
+        Block until every keyword finished, returns False if the timeout expired first.
+        """
+        return self._finished.wait(timeout)
+
+    def stop(self):
+        """
+        Drop the keywords that did not start yet, running keywords finish and are checkpointed.
+        """
+        with self._lock:
+            self.status = "stopped"
+            self._queued = []
+            jobs = list(self.jobs.values())
+        if self.job_queue is None:
+            return
+        for job in jobs:
+            self.job_queue.cancel(job)
+        if self._owns_queue:
+            self.job_queue.shutdown()
+        if all(job.finished_at for job in jobs):
+            self.finished_at = time.time()
+            self._finished.set()
+
+    def elapsed(self):
+        if self.started_at is None:
+            return self.elapsed_before
+        return self.elapsed_before + (self.finished_at or time.time()) - self.started_at
+
+    def report(self):
+        with self._lock:
+            done = len(self.completed)
+            failed = len([job for job in self.jobs.values() if job.status == "failed"])
+            domains = len([keyword for keyword in self.domains.values() if keyword in self.completed])
+            leads = sum(len(summary["leads"]) for summary in self.completed.values())
+            duplicates = sum(summary["progress"].get("blogs_duplicate", 0) for summary in self.completed.values())
+        hours = self.elapsed() / 3600
+        return {
+            "campaign_id": self.id,
+            "status": self.status,
+            "checkpoint": self.checkpoint_path,
+            "keywords_total": len(self.keywords),
+            "keywords_done": done,
+            "keywords_failed": failed,
+            "domains": domains,
+            "duplicate_domains_skipped": duplicates,
+            "leads": leads,
+            "elapsed_seconds": round(self.elapsed(), 1),
+            "keywords_per_hour": round(done / hours, 1) if hours else 0.0,
+            "domains_per_hour": round(domains / hours, 1) if hours else 0.0,
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a list of keywords through the pipeline as one campaign")
+    parser.add_argument("keywords", nargs="*", help="Keywords to run, defaults to keywords.pinterest_titles")
+    parser.add_argument("--file", help="File with one keyword per line")
+    parser.add_argument("--workers", type=int, default=CAMPAIGN_WORKERS)
+    parser.add_argument("--checkpoint", help="Checkpoint file, by default derived from the keyword list")
+    args = parser.parse_args()
+    keywords = list(args.keywords)
+    if args.file:
+        keywords += load_keywords(args.file)
+    if not keywords:
+        keywords = list(pinterest_titles)
+    campaign = Campaign(keywords, workers=args.workers, checkpoint_path=args.checkpoint).start()
+    try:
+        campaign.wait()
+    except KeyboardInterrupt:
+        print("Interrupted, waiting for the running keywords to finish. Run the same command again to resume.")
+        campaign.stop()
+    print(json.dumps(campaign.report(), indent=2))
+    if not crm_outbox.flush():
+        print("Some leads are still waiting for the CRM, they are sent on the next run.")
@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dotenv import load_dotenv
+import contextvars
+import time
+import os
+
+from metrics import metrics
+
+load_dotenv()
+CRAWL_CONCURRENCY = int(os.getenv('CRAWL_CONCURRENCY', 4))
+DOMAIN_TIMEOUT = int(os.getenv('DOMAIN_TIMEOUT', 300))
+
+
+class DomainResult:
+    """
+    Outcome of processing a single domain.
+    """
+    def __init__(self, href, data=None, error=None, elapsed=0.0):
+        self.href = href
+        self.data = data
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def crawl_domains(hrefs, process_domain, max_workers=CRAWL_CONCURRENCY, timeout=DOMAIN_TIMEOUT):
+    """
+    Process domains concurrently and yield a DomainResult as soon as each one finishes.
+    An error or timeout on one domain never affects the others.
+
+    Args:
+        hrefs: List of blog URLs to process
+        process_domain: Callable taking (href, deadline) and returning the extracted data or None.
+            deadline is a time.monotonic() value the callable should try to finish before.
+        max_workers: Maximum number of domains processed at the same time
+        timeout: Maximum time in seconds spent on a single domain
+    """
+    started = {}
+
+    def run(href):
+        started[href] = time.monotonic()
+        with metrics.timed("domain"):
+            return process_domain(href, started[href] + timeout)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="crawl")
+    try:
+        # Each worker gets a copy of the caller's context so its stages land in the same job trace
+        pending = {executor.submit(contextvars.copy_context().run, run, href): href for href in hrefs}
+        while pending:
+            done, _ = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            for future in done:
+                href = pending.pop(future)
+                elapsed = now - started.get(href, now)
+                try:
+                    yield DomainResult(href, data=future.result(), elapsed=elapsed)
+                except Exception as e:
+                    yield DomainResult(href, error=str(e), elapsed=elapsed)
+            for future, href in list(pending.items()):
+                # The worker thread can't be killed, it's abandoned and stops at its own deadline
+                if href in started and now - started[href] > timeout:
+                    pending.pop(future)
+                    yield DomainResult(href, error=f"Timed out after {timeout}s", elapsed=now - started[href])
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,305 @@
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+import threading
+import requests
+import sqlite3
+import random
+import json
+import time
+import os
+
+from page_cache import CACHE_DIR
+from result_store import result_store, normalize_domain
+from metrics import metrics
+
+load_dotenv()
+CRM_URL = os.getenv('CRM_URL')
+CRM_TOKEN = os.getenv('CRM_TOKEN')
+# Endpoint accepting a JSON list of leads in one request, leads are sent one by one when unset
+CRM_BATCH_URL = os.getenv('CRM_BATCH_URL')
+CRM_BATCH_SIZE = int(os.getenv('CRM_BATCH_SIZE', 20))
+CRM_MAX_ATTEMPTS = int(os.getenv('CRM_MAX_ATTEMPTS', 8))
+CRM_BACKOFF_BASE = float(os.getenv('CRM_BACKOFF_BASE', 5))
+CRM_BACKOFF_MAX = float(os.getenv('CRM_BACKOFF_MAX', 3600))
+CRM_TIMEOUT = float(os.getenv('CRM_TIMEOUT', 30))
+CRM_POLL_INTERVAL = float(os.getenv('CRM_POLL_INTERVAL', 5))
+CRM_POOL_SIZE = int(os.getenv('CRM_POOL_SIZE', 4))
+# A lead claimed by a sender that died is handed to another one after this many seconds
+CRM_CLAIM_TIMEOUT = float(os.getenv('CRM_CLAIM_TIMEOUT', 900))
+CRM_OUTBOX_PATH = os.getenv('CRM_OUTBOX_PATH', os.path.join(CACHE_DIR, 'crm_outbox.sqlite3'))
+# Client errors that will fail the same way on every attempt
+PERMANENT_STATUS_CODES = {400, 401, 403, 404, 405, 409, 410, 413, 422}
+
+
+def lead_key(data):
+    """
+    Leads are deduplicated on their email, or on their domain when they have none.
+    """
+    if data.get("email"):
+        return "email:" + data["email"].strip().lower()
+    return "domain:" + normalize_domain(data["website"])
+
+
+def backoff_delay(attempts, base=CRM_BACKOFF_BASE, maximum=CRM_BACKOFF_MAX):
+    return min(maximum, base * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+
+
+def is_permanent(error):
+    response = getattr(error, "response", None)
+    return response is not None and response.status_code in PERMANENT_STATUS_CODES
+
+
+def create_session(pool_size=CRM_POOL_SIZE, token=CRM_TOKEN):
+    """
+    Keep-alive session with a connection pool, retries are handled by the outbox.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {token}",
+    })
+    return session
+
+
+class CrmOutbox:
+    """
+    Persistent queue of leads for the CRM, drained by a background sender thread.
+    Leads survive restarts and CRM outages. Failed sends are retried with exponential backoff
+    and moved to the dead letters after max_attempts or a permanent client error.
+
+    Args:
+        path: Path of the SQLite database
+        url: CRM endpoint taking one lead
+        batch_url: Optional CRM endpoint taking a list of leads
+        batch_size: Maximum number of leads per batch request
+        max_attempts: Attempts before a lead becomes a dead letter
+        session: Optional requests.Session, a pooled one is created by default
+    """
+    def __init__(self, path=CRM_OUTBOX_PATH, url=CRM_URL, batch_url=CRM_BATCH_URL, batch_size=CRM_BATCH_SIZE,
+                 max_attempts=CRM_MAX_ATTEMPTS, session=None):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.url = url
+        self.batch_url = batch_url
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.session = session or create_session()
+        self.stats = {"queued": 0, "duplicates": 0, "sent": 0, "failed_attempts": 0, "dead": 0, "requests": 0, "batch_requests": 0}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                key TEXT PRIMARY KEY,
+                website TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+        self._conn.commit()
+
+    def enqueue(self, data):
+        """
+        Queue a lead for delivery. A lead that is being sent, was already sent or is a dead letter is not queued again,
+        a lead still waiting in the outbox gets the newer data.
+
+        Args:
+            data: Extracted data dict with at least a website key
+        Returns:
+            True if the lead is waiting for delivery
+        """
+        key = lead_key(data)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT status FROM outbox WHERE key = ?", (key,)).fetchone()
+            if row and row["status"] != "pending":
+                self.stats["duplicates"] += 1
+                return False
+            self._conn.execute("""
+                INSERT INTO outbox (key, website, payload, status, next_attempt_at, created_at, updated_at)
+                VALUES (?, ?, ?, 'pending', ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET website = excluded.website, payload = excluded.payload, updated_at = excluded.updated_at
+            """, (key, data["website"], json.dumps(data), now, now, now))
+            self._conn.commit()
+            self.stats["queued" if row is None else "duplicates"] += 1
+        result_store.set_crm_status(data["website"], "queued")
+        self.start()
+        self._wake.set()
+        return True
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="crm-outbox", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        if not self.url and not self.batch_url:
+            print("CRM_URL is not set, leads stay in the outbox until it is.")
+            return
+        while True:
+            try:
+                sent = self.send_due()
+            except Exception as e:
+                print(f"CRM outbox sender failed: {e}")
+                sent = 0
+            # Keep draining while there is work, otherwise sleep until woken or the next poll
+            if not sent:
+                self._wake.wait(CRM_POLL_INTERVAL)
+                self._wake.clear()
+
+    def _claim(self, limit):
+        """
+        Mark up to limit due leads as sending and return them. Each lead is claimed with its own conditional UPDATE,
+        so a sender in another process sharing the database never gets the same lead.
+        """
+        now = time.time()
+        due = "(status = 'pending' AND next_attempt_at <= ?) OR (status = 'sending' AND updated_at <= ?)"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key, website, payload, attempts FROM outbox WHERE {due} ORDER BY next_attempt_at LIMIT ?",
+                (now, now - CRM_CLAIM_TIMEOUT, limit),
+            ).fetchall()
+            claimed = []
+            for row in rows:
+                cursor = self._conn.execute(
+                    f"UPDATE outbox SET status = 'sending', updated_at = ? WHERE key = ? AND ({due})",
+                    (now, row["key"], now, now - CRM_CLAIM_TIMEOUT),
+                )
+                if cursor.rowcount:
+                    claimed.append(dict(row))
+            self._conn.commit()
+        return claimed
+
+    def _waiting(self):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE (status = 'pending' AND next_attempt_at <= ?) OR status = 'sending'",
+                (time.time(),),
+            ).fetchone()
+        return row[0]
+
+    def send_due(self):
+        """
+        Claim and send one batch of the leads that are due. Returns the number of leads attempted.
+        """
+        rows = self._claim(self.batch_size if self.batch_url else 1)
+        if not rows:
+            return 0
+        if self.batch_url and len(rows) > 1:
+            try:
+                self._post(self.batch_url, [json.loads(row["payload"]) for row in rows])
+                self.stats["batch_requests"] += 1
+                for row in rows:
+                    self._mark_sent(row)
+                return len(rows)
+            except requests.exceptions.RequestException as e:
+                if not is_permanent(e):
+                    for row in rows:
+                        self._mark_failed(row, e)
+                    return len(rows)
+                # The batch was refused as a whole, find the offending leads by sending them one by one
+                print(f"CRM refused a batch of {len(rows)} leads, sending them one by one: {e}")
+        for row in rows:
+            try:
+                self._post(self.url or self.batch_url, json.loads(row["payload"]) if self.url else [json.loads(row["payload"])])
+                self._mark_sent(row)
+            except requests.exceptions.RequestException as e:
+                self._mark_failed(row, e)
+        return len(rows)
+
+    def _post(self, url, body):
+        self.stats["requests"] += 1
+        with metrics.timed("crm_send", batch=str(isinstance(body, list)).lower()):
+            response = self.session.post(url, json=body, timeout=CRM_TIMEOUT)
+            response.raise_for_status()
+        return response
+
+    def _mark_sent(self, row):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET status = 'sent', attempts = attempts + 1, last_error = NULL, updated_at = ? WHERE key = ?",
+                (time.time(), row["key"]),
+            )
+            self._conn.commit()
+            self.stats["sent"] += 1
+        metrics.incr("crm_leads_total", result="sent")
+        result_store.set_crm_status(row["website"], "sent")
+        print(f"Lead for {row['website']} sent to CRM")
+
+    def _mark_failed(self, row, error):
+        attempts = row["attempts"] + 1
+        dead = attempts >= self.max_attempts or is_permanent(error)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ? WHERE key = ?",
+                ("dead" if dead else "pending", attempts, now + backoff_delay(attempts), str(error), now, row["key"]),
+            )
+            self._conn.commit()
+            self.stats["dead" if dead else "failed_attempts"] += 1
+        metrics.incr("crm_leads_total", result="dead" if dead else "retrying")
+        result_store.set_crm_status(row["website"], "dead" if dead else "retrying")
+        print(f"Failed to send {row['website']} to CRM (attempt {attempts}){', moved to dead letters' if dead else ''}: {error}")
+
+    def dead_letters(self, limit=100):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, website, payload, attempts, last_error, updated_at FROM outbox WHERE status = 'dead' "
+                "ORDER BY updated_at DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [{**dict(row), "payload": json.loads(row["payload"])} for row in rows]
+
+    def retry_dead(self, key=None):
+        """
+        Move dead letters back to the queue, all of them or only the one with the given key.
+        Returns the number of leads requeued.
+        """
+        now = time.time()
+        with self._lock:
+            query = "UPDATE outbox SET status = 'pending', attempts = 0, next_attempt_at = ?, updated_at = ? WHERE status = 'dead'"
+            params = (now, now)
+            if key is not None:
+                query += " AND key = ?"
+                params += (key,)
+            count = self._conn.execute(query, params).rowcount
+            self._conn.commit()
+        if count:
+            self.start()
+            self._wake.set()
+        return count
+
+    def flush(self, timeout=60):
+        """
+        Wait until no lead is due for delivery, returns False if some still are after timeout seconds.
+        """
+        if not self.url and not self.batch_url:
+            return False
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not self._waiting():
+                return True
+            self._wake.set()
+            time.sleep(0.5)
+        return False
+
+    def get_stats(self):
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+        return {**self.stats, "outbox": counts}
+
+
+crm_outbox = CrmOutbox()
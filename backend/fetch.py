@@ -0,0 +1,182 @@
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+import asyncio
+import threading
+import httpx
+import re
+import os
+
+from metrics import metrics
+
+import aio
+
+load_dotenv()
+HTTP_FETCH_ENABLED = os.getenv('HTTP_FETCH_ENABLED', '1') == '1'
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', 15))
+HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', 100))
+HTTP_MAX_PER_HOST = int(os.getenv('HTTP_MAX_PER_HOST', 4))
+# With the eager page load strategy this only bounds the wait for the HTML itself
+BROWSER_PAGE_LOAD_TIMEOUT = int(os.getenv('BROWSER_PAGE_LOAD_TIMEOUT', 20))
+BROWSER_DOM_TIMEOUT = float(os.getenv('BROWSER_DOM_TIMEOUT', 10))
+# How long a client rendered page gets to put its content in the DOM
+BROWSER_RENDER_TIMEOUT = float(os.getenv('BROWSER_RENDER_TIMEOUT', 3))
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36'
+
+# Status codes that usually mean a bot wall rather than a missing page
+BLOCKED_STATUS_CODES = {401, 403, 429, 503}
+# Markers of bot challenge pages only, a reCAPTCHA script on a contact form or a <noscript> notice is not a wall.
+# Pages that just say "enable JavaScript" without server rendered text are caught by MIN_TEXT_LENGTH.
+BLOCKED_MARKERS = re.compile(
+    r'cf-chl|/cdn-cgi/challenge-platform/|<title>\s*(?:just a moment|attention required|access denied)|captcha-delivery\.com|px-captcha',
+    re.IGNORECASE,
+)
+TAG_RE = re.compile(r'<[^>]+>')
+SCRIPT_STYLE_RE = re.compile(r'<(script|style)\b[^>]*>.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+# Pages with less visible text than this are probably rendered client side
+MIN_TEXT_LENGTH = 200
+
+
+class HttpFetcher:
+    """
+    Pooled async HTTP client with keep-alive, compression, redirects and a per-host connection limit.
+    """
+    def __init__(self, max_connections=HTTP_MAX_CONNECTIONS, max_per_host=HTTP_MAX_PER_HOST, timeout=HTTP_TIMEOUT):
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self._client = None
+        # host -> [semaphore, requests using it], only hosts with requests in flight are kept
+        self._host_limits = {}
+
+    def _get_client(self):
+        # Created lazily so the client is bound to the background loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                follow_redirects=True,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                headers={
+                    "User-Agent": USER_AGENT,
+                    "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.8",
+                    "Accept-Language": "en-US,en;q=0.9",
+                },
+            )
+        return self._client
+
+    async def fetch(self, url):
+        host = urlparse(url).netloc
+        limit = self._host_limits.setdefault(host, [asyncio.Semaphore(self.max_per_host), 0])
+        limit[1] += 1
+        try:
+            async with limit[0]:
+                return await self._get_client().get(url)
+        finally:
+            limit[1] -= 1
+            # Runs on the single background loop, so nobody can grab the entry between the check and the delete
+            if not limit[1]:
+                del self._host_limits[host]
+
+    def get(self, url):
+        return aio.run(self.fetch(url), timeout=self.timeout * 2)
+
+
+def needs_browser(response):
+    """
+    Decide whether a plain HTTP response is good enough or the page has to be rendered in Chrome.
+    """
+    if response.status_code in BLOCKED_STATUS_CODES:
+        return True
+    if response.status_code >= 400:
+        return False
+    if "html" not in response.headers.get("content-type", "html"):
+        return False
+    html = response.text
+    if BLOCKED_MARKERS.search(html[:20000]):
+        return True
+    visible_text = TAG_RE.sub(" ", SCRIPT_STYLE_RE.sub(" ", html))
+    return len(" ".join(visible_text.split())) < MIN_TEXT_LENGTH
+
+
+class PageFetcher:
+    """
+    Fetches pages over plain HTTP first and falls back to the Selenium driver
+    only when the page needs JavaScript or blocks the plain client.
+    """
+    def __init__(self, http=None, http_enabled=HTTP_FETCH_ENABLED):
+        self.http = http or HttpFetcher()
+        self.http_enabled = http_enabled
+        self.stats = {"http": 0, "browser": 0, "http_errors": 0, "http_rejected": 0}
+        self._lock = threading.Lock()
+
+    def fetch(self, driver, url):
+        """
+        Return the HTML of a page.
+
+        Args:
+            driver: WebDriver instance used as fallback
+            url: URL of the page
+        """
+        if self.http_enabled:
+            try:
+                with metrics.timed("fetch", method="http"):
+                    response = self.http.get(url)
+                if not needs_browser(response):
+                    self._count("http")
+                    return response.text
+                self._count("http_rejected")
+            except Exception as e:
+                self._count("http_errors")
+                print(f"HTTP fetch failed for {url}, falling back to browser: {e}")
+        with metrics.timed("fetch", method="browser"):
+            html = browser_get(driver, url)
+        self._count("browser")
+        return html
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+        metrics.incr("pages_fetched_total", result=key)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        total = stats["http"] + stats["browser"]
+        stats["http_ratio"] = stats["http"] / total if total else 0.0
+        return stats
+
+
+def browser_get(driver, url):
+    """
+    Load a page in the browser and return its source once the DOM is ready.
+    A page still loading after the page load timeout is stopped and its DOM so far is used.
+    Client rendered pages get a short extra wait for their text to appear.
+    """
+    driver.set_page_load_timeout(BROWSER_PAGE_LOAD_TIMEOUT)
+    try:
+        driver.get(url)
+    except TimeoutException:
+        print(f"Page load of {url} timed out, using what has loaded")
+        driver.execute_script("window.stop();")
+    try:
+        WebDriverWait(driver, BROWSER_DOM_TIMEOUT).until(
+            lambda d: d.execute_script("return document.readyState") in ("interactive", "complete")
+        )
+    except TimeoutException:
+        raise Exception(f"DOM of {url} not ready after {BROWSER_DOM_TIMEOUT}s")
+    try:
+        WebDriverWait(driver, BROWSER_RENDER_TIMEOUT, poll_frequency=0.2).until(
+            lambda d: d.execute_script("return document.body ? document.body.innerText.length : 0") >= MIN_TEXT_LENGTH
+        )
+    except TimeoutException:
+        # Short pages are fine, there is just nothing more to wait for
+        pass
+    return driver.page_source
+
+
+page_fetcher = PageFetcher()
+
+
+def fetch_page(driver, url):
+    return page_fetcher.fetch(driver, url)
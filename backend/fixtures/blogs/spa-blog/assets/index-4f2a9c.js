@@ -0,0 +1,9 @@
+// Stand-in for the bundled React app: the content only exists after JavaScript runs
+const root = document.getElementById("root");
+root.innerHTML = `
+  <header><nav><a href="/">Home</a> <a href="/about">About</a> <a href="/shop">Shop</a></nav></header>
+  <main>
+    <h1>Bloom &amp; Pin</h1>
+    <p>Pinterest strategy for florists and wedding planners, by Maria Lopez.</p>
+    <p>Say hi: <a href="mailto:maria@bloomandpin.com">maria@bloomandpin.com</a></p>
+  </main>`;
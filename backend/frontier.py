@@ -0,0 +1,88 @@
+from dotenv import load_dotenv
+import heapq
+import time
+import os
+
+from url_filter import normalize_url
+from prompt_budget import link_score
+
+load_dotenv()
+CRAWL_MAX_DEPTH = int(os.getenv('CRAWL_MAX_DEPTH', 2))
+CRAWL_MAX_PAGES = int(os.getenv('CRAWL_MAX_PAGES', 6))
+CRAWL_MAX_SECONDS = float(os.getenv('CRAWL_MAX_SECONDS', 90))
+
+
+class CrawlFrontier:
+    """
+    Priority queue of the pages of one domain still to visit, best scored first,
+    bounded by link depth, number of pages and wall-clock time.
+
+    Args:
+        max_depth: Links found deeper than this many hops from the start links are ignored
+        max_pages: Maximum number of pages handed out
+        max_seconds: Maximum time in seconds since the frontier was created
+        deadline: Optional time.monotonic() value that overrides max_seconds when it comes earlier
+    """
+    def __init__(self, max_depth=CRAWL_MAX_DEPTH, max_pages=CRAWL_MAX_PAGES, max_seconds=CRAWL_MAX_SECONDS, deadline=None):
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.deadline = time.monotonic() + max_seconds
+        if deadline is not None:
+            self.deadline = min(self.deadline, deadline)
+        self.heap = []
+        self.seen = set()
+        self.pages = 0
+        self._order = 0
+
+    def push(self, url, depth=1, anchors=None, min_score=None):
+        """
+        Add a URL unless it was already queued or visited, too deep, or scored below min_score.
+        """
+        key = normalize_url(url)
+        if key in self.seen or depth > self.max_depth:
+            return False
+        score = link_score(url, anchors)
+        if score < 0 or (min_score is not None and score < min_score):
+            return False
+        self.seen.add(key)
+        # Ties keep insertion order, the start links come ranked already
+        heapq.heappush(self.heap, (-score, depth, self._order, url))
+        self._order += 1
+        return True
+
+    def exhausted_reason(self):
+        if self.pages >= self.max_pages:
+            return "page budget"
+        if time.monotonic() >= self.deadline:
+            return "time budget"
+        if not self.heap:
+            return "no links left"
+        return None
+
+    def pop(self, tie_breaker=None):
+        """
+        Return the next (url, depth) to visit or None when a budget ran out or nothing is left.
+
+        Args:
+            tie_breaker: Optional callable choosing one URL out of the ones sharing the best score
+        """
+        if self.exhausted_reason():
+            return None
+        best = self.heap[0][0]
+        # Entries sharing the best score can be anywhere in the heap, not only at index 1
+        ties = [entry for entry in self.heap if entry[0] == best] if tie_breaker is not None else []
+        if len(ties) > 1:
+            try:
+                choice = tie_breaker([entry[3] for entry in ties])
+            except Exception as e:
+                print(f"Tie breaker failed, using the first link: {e}")
+                choice = None
+            for entry in ties:
+                if entry[3] == choice:
+                    self.heap.remove(entry)
+                    heapq.heapify(self.heap)
+                    self.pages += 1
+                    return entry[3], entry[1]
+        _, depth, _, url = heapq.heappop(self.heap)
+        self.pages += 1
+        return url, depth
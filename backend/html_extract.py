@@ -0,0 +1,177 @@
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse
+from dotenv import load_dotenv
+import re
+import os
+
+load_dotenv()
+# Upper bound on the markdown kept per page so LLM prompts stay bounded
+HTML_MAX_CHARS = int(os.getenv('HTML_MAX_CHARS', 40000))
+
+SKIPPED_TAGS = {"head", "script", "style", "noscript", "svg", "template", "iframe", "canvas", "video", "audio", "picture", "object"}
+# Tags that may appear in the head, any other tag means the optional </head> was left out
+HEAD_TAGS = {"title", "meta", "link", "base", "style", "script", "noscript", "template"}
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+BLOCK_TAGS = {"p", "div", "section", "article", "main", "header", "footer", "aside", "nav", "ul", "ol", "table", "tr", "form", "blockquote", "figure", "address"}
+HEADING_TAGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+IMAGE_LINK_RE = re.compile(r'\.(?:jpg|jpeg|png|gif|bmp|svg|webp)(?:\?.*)?$', re.IGNORECASE)
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+class PageExtract:
+    """
+    Result of extracting a page: bounded markdown text and the same-domain links with their anchor text.
+    """
+    def __init__(self, markdown, links, anchors):
+        self.markdown = markdown
+        self.links = links
+        self.anchors = anchors
+
+
+class MarkdownExtractor(HTMLParser):
+    """
+    Single pass, streaming html to markdown conversion.
+    Drops head/script/style/img and base64 content, collects links and stops
+    writing text once max_chars is reached (links are still collected).
+    """
+    def __init__(self, base_url=None, max_chars=HTML_MAX_CHARS):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.base_host = strip_www(urlparse(base_url).netloc.lower()) if base_url else None
+        self.max_chars = max_chars
+        self.parts = []
+        self.length = 0
+        self.links = []
+        self.anchors = {}
+        self._skip = []
+        self._in_link = False
+        self._link = None
+        self._link_text = []
+
+    def write(self, text):
+        if self.length >= self.max_chars:
+            return
+        text = text[:self.max_chars - self.length]
+        self.parts.append(text)
+        self.length += len(text)
+
+    def newline(self):
+        if self.parts and not self.parts[-1].endswith("\n"):
+            self.write("\n")
+
+    def handle_starttag(self, tag, attrs):
+        if self._skip:
+            if self._skip[0] != "head" or (tag != "body" and tag in HEAD_TAGS):
+                if tag not in VOID_TAGS:
+                    self._skip.append(tag)
+                return
+            # The body started without </head>, stop skipping
+            self._skip = []
+        if tag in SKIPPED_TAGS:
+            self._skip.append(tag)
+            return
+        if tag in HEADING_TAGS:
+            self.newline()
+            self.write("#" * HEADING_TAGS[tag] + " ")
+        elif tag == "li":
+            self.newline()
+            self.write("- ")
+        elif tag == "br":
+            self.newline()
+        elif tag in BLOCK_TAGS:
+            self.newline()
+        elif tag == "a":
+            if self._in_link:
+                self.end_link()
+            href = dict(attrs).get("href")
+            self._in_link = True
+            self._link = self.resolve(href) if href else None
+            self._link_text = []
+
+    def handle_startendtag(self, tag, attrs):
+        if tag == "br" and not self._skip:
+            self.newline()
+
+    def handle_endtag(self, tag):
+        if self._skip:
+            # Pop back to the matching tag so unclosed children don't leak
+            if tag in self._skip:
+                while self._skip and self._skip.pop() != tag:
+                    pass
+            return
+        if tag == "a" and self._in_link:
+            self.end_link()
+        elif tag in HEADING_TAGS or tag in BLOCK_TAGS or tag == "li":
+            self.newline()
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        text = WHITESPACE_RE.sub(" ", data)
+        if not text.strip():
+            if self.parts and not self.parts[-1].endswith((" ", "\n")):
+                self.write(" ")
+            return
+        if self._in_link:
+            self._link_text.append(text)
+        else:
+            self.write(text)
+
+    def end_link(self):
+        href = self._link
+        text = "".join(self._link_text).strip()
+        self._in_link = False
+        self._link = None
+        self._link_text = []
+        if href is None:
+            self.write(text)
+            return
+        # Image links are dropped entirely
+        if IMAGE_LINK_RE.search(href):
+            return
+        if href.startswith("mailto:"):
+            self.write(f"[{text}]({href})")
+        elif href.startswith(("http://", "https://")):
+            self.write(f"[{text}]({href})")
+            if self.base_host is None or strip_www(urlparse(href).netloc.lower()) == self.base_host:
+                if href not in self.anchors:
+                    self.links.append(href)
+                    self.anchors[href] = text
+                elif text and not self.anchors[href]:
+                    self.anchors[href] = text
+        else:
+            self.write(text)
+
+    def resolve(self, href):
+        href = href.strip()
+        if href.startswith(("data:", "javascript:", "#")):
+            return None
+        if href.startswith(("mailto:", "tel:")):
+            return href
+        return urljoin(self.base_url, href) if self.base_url else href
+
+    def result(self):
+        if self._in_link:
+            self.end_link()
+        lines = (line.strip() for line in "".join(self.parts).split("\n"))
+        markdown = "\n".join(line for line in lines if line)
+        return PageExtract(markdown, self.links, self.anchors)
+
+
+def strip_www(host):
+    return host[4:] if host.startswith("www.") else host
+
+
+def extract_page(html_content, base_url=None, max_chars=HTML_MAX_CHARS):
+    """
+    Convert html to bounded markdown and collect the links pointing to the same domain, in one traversal.
+
+    Args:
+        html_content: Raw html of the page
+        base_url: URL of the page, used to resolve relative links and to decide which links are on the same domain
+        max_chars: Maximum length of the markdown
+    """
+    extractor = MarkdownExtractor(base_url, max_chars)
+    extractor.feed(html_content)
+    extractor.close()
+    return extractor.result()
@@ -0,0 +1,162 @@
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+import threading
+import time
+import uuid
+import os
+
+from metrics import metrics
+
+load_dotenv()
+MAX_CONCURRENT_JOBS = int(os.getenv('MAX_CONCURRENT_JOBS', 2))
+MAX_FINISHED_JOBS = int(os.getenv('MAX_FINISHED_JOBS', 500))
+
+
+class Job:
+    """
+    A single keyword run tracked by the job queue.
+    """
+    def __init__(self, keyword):
+        self.id = uuid.uuid4().hex
+        self.keyword = keyword
+        self.status = "queued"
+        self.error = None
+        self.results = []
+        self.posts = []
+        self.progress = {
+            "search_pages": 0,
+            "search_results": 0,
+            "candidate_blogs": 0,
+            "blogs_skipped": 0,
+            "blogs_duplicate": 0,
+            "blogs_processed": 0,
+            "blogs_failed": 0,
+            "leads_found": 0,
+        }
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.trace = None
+        self._future = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def set_results(self, results):
+        with self._lock:
+            self.results = list(results)
+
+    def add_post(self, post):
+        with self._lock:
+            self.posts.append(post)
+
+    def incr(self, counter, amount=1):
+        with self._lock:
+            self.progress[counter] = self.progress.get(counter, 0) + amount
+
+    def wait(self, timeout=None):
+        """
+        Block until the job finished, returns False if the timeout expired first.
+        """
+        return self._done.wait(timeout)
+
+    def to_dict(self, include_results=False):
+        with self._lock:
+            data = {
+                "job_id": self.id,
+                "keyword": self.keyword,
+                "status": self.status,
+                "error": self.error,
+                "progress": dict(self.progress),
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "trace": self.trace.summary() if self.trace else None,
+            }
+            if include_results:
+                data["results"] = list(self.results)
+                data["posts"] = list(self.posts)
+            return data
+
+
+class JobQueue:
+    """
+    Runs jobs on a bounded pool of background workers.
+
+    Args:
+        runner: Callable taking a Job, does the actual work and fills in the job
+        max_workers: Maximum number of jobs running at the same time
+        on_finish: Optional callable taking the Job, called once it is done or failed
+    """
+    def __init__(self, runner, max_workers=MAX_CONCURRENT_JOBS, on_finish=None):
+        self.runner = runner
+        self.on_finish = on_finish
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, keyword, runner=None, on_finish=None):
+        """
+        Queue a keyword. runner and on_finish override the ones of the queue for this job,
+        so campaigns share the queue and its worker limit with single keyword jobs.
+        """
+        job = Job(keyword)
+        with self._lock:
+            self.jobs[job.id] = job
+            self._prune()
+        job._future = self.executor.submit(self._run, job, runner or self.runner, on_finish or self.on_finish)
+        return job
+
+    def cancel(self, job):
+        """
+        Drop a job that did not start yet, returns False if it is already running or finished.
+        """
+        if job._future is None or not job._future.cancel():
+            return False
+        job.status = "cancelled"
+        job.finished_at = time.time()
+        job._done.set()
+        return True
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self.jobs.values())
+
+    def _run(self, job, runner, on_finish):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            with metrics.trace() as trace:
+                job.trace = trace
+                runner(job)
+            job.status = "done"
+        except Exception as e:
+            print(f"Job {job.id} failed: {str(e)}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            if on_finish is not None:
+                try:
+                    on_finish(job)
+                except Exception as e:
+                    print(f"Finish callback of job {job.id} failed: {str(e)}")
+            job._done.set()
+
+    def shutdown(self, cancel_pending=True):
+        """
+        Stop accepting jobs, queued jobs are dropped unless cancel_pending is False. Running jobs finish.
+        """
+        self.executor.shutdown(wait=False, cancel_futures=cancel_pending)
+
+    def _prune(self):
+        # Only keep the most recent finished jobs around so memory stays bounded
+        finished = [job for job in self.jobs.values() if job.finished_at]
+        if len(finished) <= MAX_FINISHED_JOBS:
+            return
+        finished.sort(key=lambda job: job.finished_at)
+        for job in finished[:len(finished) - MAX_FINISHED_JOBS]:
+            del self.jobs[job.id]
@@ -0,0 +1,265 @@
+from openai import AsyncOpenAI, RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+from concurrent.futures import Future
+from dotenv import load_dotenv
+import threading
+import asyncio
+import random
+import time
+import os
+
+import aio
+from metrics import metrics
+from prompt_budget import count_tokens
+from llm_cache import llm_cache, cache_key
+
+load_dotenv(dotenv_path=".env.local")
+LLM_RPM = int(os.getenv('LLM_RPM', 500))
+LLM_TPM = int(os.getenv('LLM_TPM', 200000))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 6))
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', 120))
+LLM_BATCH_SIZE = int(os.getenv('LLM_BATCH_SIZE', 8))
+LLM_BATCH_WAIT = float(os.getenv('LLM_BATCH_WAIT', 0.5))
+# Rough reservation for the response when estimating how many tokens a call uses
+EXPECTED_OUTPUT_TOKENS = 300
+
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+
+def prompt_tokens(input):
+    """
+    Count the tokens of a prompt locally, a few extra per message for the chat formatting.
+    """
+    if isinstance(input, str):
+        return count_tokens(input)
+    return sum(count_tokens(str(message.get("content", ""))) + 4 for message in input)
+
+
+class RateLimiter:
+    """
+    Token buckets for requests per minute and tokens per minute, refilled continuously.
+    Must only be used from the background event loop.
+    """
+    def __init__(self, rpm=LLM_RPM, tpm=LLM_TPM):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests = float(rpm)
+        self.tokens = float(tpm)
+        self.updated_at = time.monotonic()
+        self._lock = None
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated_at
+        self.updated_at = now
+        self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60)
+        self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60)
+
+    async def acquire(self, tokens):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # A single call bigger than the whole budget waits for a full bucket instead of forever
+        tokens = min(tokens, self.tpm)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.requests >= 1 and self.tokens >= tokens:
+                    self.requests -= 1
+                    self.tokens -= tokens
+                    return
+                wait_requests = (1 - self.requests) * 60 / self.rpm if self.requests < 1 else 0
+                wait_tokens = (tokens - self.tokens) * 60 / self.tpm if self.tokens < tokens else 0
+                await asyncio.sleep(max(wait_requests, wait_tokens, 0.01))
+
+    def adjust(self, tokens):
+        """
+        Correct the bucket once the real token usage of a call is known.
+        """
+        self.tokens = min(self.tpm, self.tokens - tokens)
+
+    def pause(self, seconds):
+        """
+        Empty the buckets so nothing is sent for a while, used when the API answers 429.
+        """
+        self._refill()
+        self.requests = min(self.requests, 1 - seconds * self.rpm / 60)
+
+
+class LLMClient:
+    """
+    Runs OpenAI structured output calls concurrently on the background event loop,
+    within the requests and tokens per minute budgets, retrying with backoff on 429s and transient errors.
+    Responses are memoized in the LLM cache so identical calls are only paid for once.
+    """
+    def __init__(self, rpm=LLM_RPM, tpm=LLM_TPM, max_retries=LLM_MAX_RETRIES, cache=llm_cache):
+        self.limiter = RateLimiter(rpm, tpm)
+        self.cache = cache
+        self.max_retries = max_retries
+        self._client = None
+        self.stats = {"calls": 0, "retries": 0, "rate_limited": 0, "input_tokens": 0, "output_tokens": 0}
+        # Token counts and latency per call type, e.g. scrape_blog_data or best_url_to_follow
+        self.call_stats = {}
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0, timeout=LLM_TIMEOUT)
+        return self._client
+
+    def set_client(self, client):
+        """
+        Replace the underlying async OpenAI client, e.g. with a stub.
+        """
+        self._client = client
+
+    async def _parse_uncached(self, model, input, text_format, tokens):
+        estimate = tokens + EXPECTED_OUTPUT_TOKENS
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(estimate)
+            try:
+                response = await self._get_client().responses.parse(model=model, input=input, text_format=text_format)
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = retry_delay(e, attempt)
+                if isinstance(e, RateLimitError):
+                    self._count("rate_limited")
+                    self.limiter.pause(delay)
+                self._count("retries")
+                metrics.incr("llm_retries_total", error=type(e).__name__)
+                print(f"LLM call failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            self._record_usage(response, estimate)
+            return response
+
+    def parse(self, model, input, text_format, name=None, lookup=True):
+        """
+        Blocking equivalent of client.responses.parse that goes through the rate limiter.
+        name groups the token counts and latency of the call in call_stats.
+        lookup=False skips the cache lookup for callers that already missed it, the response is still cached.
+        """
+        started = time.monotonic()
+        tokens = prompt_tokens(input)
+        with metrics.timed("llm", name=name or model):
+            # The SQLite cache is read and written on the calling thread, only the API call runs on the shared loop
+            key = None
+            if self.cache is not None and text_format is not None:
+                key = cache_key(model, input, text_format)
+                cached = self.cache.get(key, text_format) if lookup else None
+                if cached is not None:
+                    self._record_call(name or model, tokens, cached, started)
+                    return cached
+            response = aio.run(self._parse_uncached(model, input, text_format, tokens))
+            if key is not None:
+                self.cache.put(key, model, response)
+            self._record_call(name or model, tokens, response, started)
+            return response
+
+    def _record_usage(self, response, estimate):
+        usage = getattr(response, "usage", None)
+        input_tokens = getattr(usage, "input_tokens", 0) or 0
+        output_tokens = getattr(usage, "output_tokens", 0) or 0
+        if usage is not None:
+            self.limiter.adjust(input_tokens + output_tokens - estimate)
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["input_tokens"] += input_tokens
+            self.stats["output_tokens"] += output_tokens
+
+    def _record_call(self, name, tokens, response, started):
+        usage = getattr(response, "usage", None)
+        call = {
+            "name": name,
+            "prompt_tokens": tokens,
+            "input_tokens": getattr(usage, "input_tokens", 0) or 0,
+            "output_tokens": getattr(usage, "output_tokens", 0) or 0,
+            "cached": getattr(response, "cached", False),
+            "seconds": time.monotonic() - started,
+        }
+        metrics.incr("llm_calls_total", name=name, cached=str(call["cached"]).lower())
+        metrics.incr("llm_tokens_total", call["input_tokens"], name=name, kind="input")
+        metrics.incr("llm_tokens_total", call["output_tokens"], name=name, kind="output")
+        if not call["cached"]:
+            metrics.observe("llm_call_seconds", call["seconds"], name=name)
+        with self._lock:
+            stats = self.call_stats.setdefault(name, {"calls": 0, "cached": 0, "prompt_tokens": 0, "input_tokens": 0, "output_tokens": 0, "seconds": 0.0})
+            stats["calls"] += 1
+            stats["cached"] += int(call["cached"])
+            for key in ("prompt_tokens", "input_tokens", "output_tokens", "seconds"):
+                stats[key] += call[key]
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+
+def retry_delay(error, attempt):
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return min(60, 2 ** attempt) + random.uniform(0, 1)
+
+
+class MicroBatcher:
+    """
+    Collects items submitted from different threads and hands them to batch_fn together,
+    once max_size items are waiting or max_wait seconds passed since the first one.
+
+    Args:
+        batch_fn: Callable taking a list of items and returning a list of results in the same order
+        max_size: Maximum number of items per batch
+        max_wait: Maximum time in seconds an item waits for others to join its batch
+    """
+    def __init__(self, batch_fn, max_size=LLM_BATCH_SIZE, max_wait=LLM_BATCH_WAIT):
+        self.batch_fn = batch_fn
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self.pending = []
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def submit(self, item):
+        future = Future()
+        with self._cond:
+            self.pending.append((item, future))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, daemon=True, name="llm-batcher")
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self.pending:
+                    self._cond.wait()
+                deadline = time.monotonic() + self.max_wait
+                while len(self.pending) < self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self.pending[:self.max_size]
+                self.pending = self.pending[self.max_size:]
+            # Batches run on their own thread so the next one can start collecting right away
+            threading.Thread(target=self._run, args=(batch,), daemon=True).start()
+
+    def _run(self, batch):
+        try:
+            results = self.batch_fn([item for item, _ in batch])
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+
+llm = LLMClient()
@@ -0,0 +1,106 @@
+from dotenv import load_dotenv
+import hashlib
+import json
+import time
+import zlib
+import os
+
+from page_cache import CACHE_DIR
+from sqlite_cache import SqliteCache
+
+load_dotenv()
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', '1') == '1'
+LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', 30 * 24 * 3600))
+LLM_CACHE_MAX_BYTES = int(os.getenv('LLM_CACHE_MAX_BYTES', 100 * 1024 * 1024))
+
+
+def normalize_input(input):
+    """
+    Collapse whitespace in message contents so formatting-only differences hit the same entry.
+    """
+    if isinstance(input, str):
+        return " ".join(input.split())
+    return [
+        {**message, "content": " ".join(message["content"].split())} if isinstance(message.get("content"), str) else message
+        for message in input
+    ]
+
+
+def cache_key(model, input, text_format):
+    payload = json.dumps({
+        "model": model,
+        "schema": text_format.model_json_schema() if text_format is not None else None,
+        "input": normalize_input(input),
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CachedUsage:
+    def __init__(self):
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+
+class CachedResponse:
+    """
+    Stands in for an OpenAI parse response when it is served from the cache.
+    Usage is zero since no tokens were spent.
+    """
+    def __init__(self, output_parsed):
+        self.output_parsed = output_parsed
+        self.usage = CachedUsage()
+        self.cached = True
+
+
+class LLMCache(SqliteCache):
+    """
+    Persistent memoization of structured LLM responses, keyed on a hash of model, schema and normalized input.
+    Entries expire after ttl seconds, least recently used entries are evicted above max_bytes.
+
+    Args:
+        path: Path of the SQLite database
+        ttl: Time to live of an entry in seconds
+        max_bytes: Maximum total compressed size of all entries
+    """
+    table = "responses"
+
+    def __init__(self, path=os.path.join(CACHE_DIR, 'llm.sqlite3'), ttl=LLM_CACHE_TTL, max_bytes=LLM_CACHE_MAX_BYTES):
+        super().__init__(path, ttl, max_bytes, stats=("saved_input_tokens", "saved_output_tokens"))
+
+    def create_table(self):
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                output BLOB NOT NULL,
+                input_tokens INTEGER NOT NULL,
+                output_tokens INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+
+    def get(self, key, text_format):
+        """
+        Return a CachedResponse for the key, or None on a miss.
+        """
+        row = self._lookup(key, "output, input_tokens, output_tokens")
+        if row is None:
+            return None
+        with self._lock:
+            self.stats["saved_input_tokens"] += row[1]
+            self.stats["saved_output_tokens"] += row[2]
+        return CachedResponse(text_format.model_validate_json(zlib.decompress(row[0]).decode("utf-8")))
+
+    def put(self, key, model, response):
+        usage = getattr(response, "usage", None)
+        output = zlib.compress(response.output_parsed.model_dump_json().encode("utf-8"))
+        now = time.time()
+        self._write(key, [(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, model, output, getattr(usage, "input_tokens", 0) or 0, getattr(usage, "output_tokens", 0) or 0, len(output), now, now),
+        )])
+
+
+llm_cache = LLMCache() if LLM_CACHE_ENABLED else None
@@ -1,187 +1,141 @@
-from flask import Flask, jsonify, request
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium_stealth import stealth
-from seleniumbase import Driver
+from flask import Flask, jsonify, request, Response
 from dotenv import load_dotenv
 
 import os
-from ai import filter_personal_blogs, filter_irrelavant_urls, extract_blog_data_recursively, extract_blog_content_and_links, send_results_to_crm
-import os
+from jobs import JobQueue, MAX_CONCURRENT_JOBS
+from pipeline import run_keyword
+from campaign import Campaign, CAMPAIGN_WORKERS
+from keywords import pinterest_titles
+from browser_pool import browser_pool
+from fetch import page_fetcher
+from llm import llm
+from llm_cache import llm_cache
+from crm_outbox import crm_outbox
+from metrics import metrics
 
 load_dotenv()
 AUTH = os.getenv('AUTH')
 SBR_WEBDRIVER = os.getenv('SBR_WEBDRIVER')
-# service = Service(executable_path='chromedriver.exe')
-google_list_selector= "#rso"
-results_a_tag_selector = "#rso > div > div > div > div.kb0PBd.A9Y9g.jGGQ5e > div > div > span > a"
-pagination_selector = "#botstuff > div > div:nth-child(3) > table > tbody > tr"
-pagination_item_selector = "#botstuff > div > div:nth-child(3) > table > tbody > tr > td > a"
 app = Flask(__name__)
+job_queue = JobQueue(run_keyword, max_workers=MAX_CONCURRENT_JOBS)
+campaigns = {}
+
+
+def start_background_services():
+    browser_pool.warm_up()
+    browser_pool.start_watchdog()
+    # Deliver leads left in the outbox by a previous run
+    crm_outbox.start()
+
+
+# The debug reloader runs this script twice, only the child process it marks with WERKZEUG_RUN_MAIN serves requests
+if __name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+    start_background_services()
+
+
 @app.route('/frank', methods=['POST'])
 def frank():
     keyword = request.json.get('keyword')
     if not keyword:
         return jsonify({"error": "Keyword is required"}), 400
-    else:
-        print(f"Keyword received: {keyword}")
-    driver = None
+    job = job_queue.submit(keyword)
+    print(f"Queued job {job.id} for keyword: {keyword}")
+    return jsonify({"job_id": job.id, "status": job.status}), 202
+
+
+@app.route('/frank', methods=['GET'])
+def list_jobs():
+    return jsonify({"jobs": [job.to_dict() for job in job_queue.list()]}), 200
+
+
+@app.route('/frank/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict()), 200
+
+
+@app.route('/frank/<job_id>/results', methods=['GET'])
+def job_results(job_id):
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    # Partial results are returned while the job is still running
+    return jsonify(job.to_dict(include_results=True)), 200
+
+
+@app.route('/campaigns', methods=['POST'])
+def start_campaign():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "JSON object body is required"}), 400
+    keywords = body.get('keywords')
+    if keywords is None:
+        if body.get('source') != 'pinterest_titles':
+            return jsonify({"error": "keywords or source=pinterest_titles is required"}), 400
+        keywords = list(pinterest_titles)
+    elif not isinstance(keywords, list) or not keywords or not all(isinstance(keyword, str) and keyword.strip() for keyword in keywords):
+        return jsonify({"error": "keywords must be a non-empty list of strings"}), 400
     try:
-        # Initialize driver with options
-        options = Options()
-        options.add_argument('--ignore-certificate-errors')
-        options.add_argument('--allow-insecure-localhost')
-        options.add_argument("--log-level=3")  # Suppresses INFO and WARNING logs
-        options.add_argument("start-maximized")
-        options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36')
-        options.add_argument("--headless=new")
-        # options.add_argument("--disable-blink-features=AutomationControlled")
-        options.add_experimental_option("excludeSwitches", ["enable-logging"])  # Hides DevTools logs
-        # driver = webdriver.Chrome(service=service, options=options)
-        driver = Driver(uc=True, headless=True)
-     
-        
-        
-        # Perform initial search
-        driver.get('https://www.google.com/')
-        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CLASS_NAME, "gLFyf")))
-        input_element = driver.find_element(By.CLASS_NAME, "gLFyf")
-        input_element.clear()
-        input_element.send_keys(keyword + Keys.ENTER)
-        
-        # Wait for search results to load
-        wait_for_elements(driver, [
-            (By.CSS_SELECTOR, google_list_selector),
-            (By.CSS_SELECTOR, pagination_selector)
-        ], timeout=30)
-        
-        print("Found the list of results and pagination")
-        
-        # Get initial results
-        results_hrefs = []
-        collect_results(driver, results_hrefs)
-        
-        # Process pagination
-        pagination_list = driver.find_element(By.CSS_SELECTOR, pagination_selector)
-        pagination_items = [
-            item.get_attribute("href")
-            for item in pagination_list.find_elements(By.CSS_SELECTOR, pagination_item_selector)
-            if item.get_attribute("href")
-        ]
-        
-        # Navigate through pages and collect results
-        count = 0
-        for pagination_item in pagination_items:
-            # if count >= 3:
-            #     break
-            print(f"Navigating to next page:🫡")
-            driver.get(pagination_item)
-            
-            # Perform initial search
-            driver.get('https://www.google.com/')
-            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CLASS_NAME, "gLFyf")))
-            input_element = driver.find_element(By.CLASS_NAME, "gLFyf")
-            input_element.clear()
-            input_element.send_keys(keyword + Keys.ENTER)
-            
-            # Wait for search results to load
-            wait_for_elements(driver, [
-                (By.CSS_SELECTOR, google_list_selector),
-                (By.CSS_SELECTOR, pagination_selector)
-            ], timeout=30)
-            
-            print("Found the list of results and pagination")
-            
-            # Get initial results
-            results_hrefs = []
-            collect_results(driver, results_hrefs)
-            count += 1
-        filtered_hrefs = filter_personal_blogs(results_hrefs)
-        blog_posts = []
-        for href in filtered_hrefs:
-           try:
-               md_content, links = extract_blog_content_and_links(driver, href)
-               if len(links) == 0:
-                   print(f"No links found in {href}")
-                   continue
-               print(f"Links found: {len(links)}, here's one: {links[0]}")
-               relevant_urls = filter_irrelavant_urls(links)
-               if len(relevant_urls) == 0:
-                   print(f"No relevant URLs found in {href}")
-                   continue
-               extracted_data = extract_blog_data_recursively(driver, relevant_urls)
-               extracted_data['website'] = href
-               if not extracted_data.get('email'):
-                   print(f"No email found for {href}, skipping CRM submission.")
-                   continue
-               send_results_to_crm(extracted_data)
-               blog_posts.append(
-                   extracted_data,
-               )
-           except Exception as e:
-               print(f"An error occurred while processing {href}: {str(e)}")
-        if not filtered_hrefs and not blog_posts:
-            return jsonify({"error": "No results or posts found"}), 404
-        print("Returning results...")
-        return jsonify({"results": filtered_hrefs, "posts": blog_posts}), 200
-    
-    except Exception as e:
-        print(f"An error occurred: {str(e)}")
-        return jsonify({"error": str(e)}), 500
-    
-    finally:
-        if driver:
-            driver.quit()
-
-
-def wait_for_elements(driver, element_locators, timeout=30):
-    """
-    Wait for multiple elements to be present
-    
-    Args:
-        driver: WebDriver instance
-        element_locators: List of tuples (By, selector)
-        timeout: Maximum wait time in seconds
-    """
-    for by, selector in element_locators:
-        WebDriverWait(driver, timeout).until(
-            EC.presence_of_element_located((by, selector))
-        )
-    
-
-def collect_results(driver, results_hrefs):
-    """
-    Collect all result links from the current page
-    
-    Args:
-        driver: WebDriver instance
-        results_hrefs: List to append results to
-    """
-    # Make sure results are loaded
-    WebDriverWait(driver, 20).until(
-        EC.presence_of_element_located((By.CSS_SELECTOR, results_a_tag_selector))
-    )
-    
-    # Get result container
-    results_list = driver.find_element(By.CSS_SELECTOR, google_list_selector)
-    
-    # Get all result links
-    results = results_list.find_elements(By.CSS_SELECTOR, results_a_tag_selector)
-    
-    # Extract hrefs
-    for result in results:
-        href = result.get_attribute("href")
-        if href:
-            results_hrefs.append(href)
-
-
-    
+        workers = int(body.get('workers', CAMPAIGN_WORKERS))
+    except (TypeError, ValueError):
+        workers = 0
+    if workers < 1:
+        return jsonify({"error": "workers must be a positive integer"}), 400
+    # Campaign keywords run on the shared job queue so they stay within MAX_CONCURRENT_JOBS together with /frank jobs
+    campaign = Campaign(keywords, workers=workers, job_queue=job_queue)
+    running = campaigns.get(campaign.id)
+    if running and running.status == "running":
+        return jsonify(running.report()), 200
+    campaigns[campaign.id] = campaign.start()
+    print(f"Started campaign {campaign.id} with {len(campaign.keywords)} keywords")
+    return jsonify(campaign.report()), 202
+
+
+@app.route('/campaigns', methods=['GET'])
+def list_campaigns():
+    return jsonify({"campaigns": [campaign.report() for campaign in campaigns.values()]}), 200
+
+
+@app.route('/campaigns/<campaign_id>', methods=['GET'])
+def campaign_status(campaign_id):
+    campaign = campaigns.get(campaign_id)
+    if not campaign:
+        return jsonify({"error": "Campaign not found"}), 404
+    report = campaign.report()
+    report["jobs"] = {keyword: job.id for keyword, job in campaign.jobs.items()}
+    return jsonify(report), 200
+
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    return jsonify({
+        "fetch": page_fetcher.get_stats(),
+        "browser_pool": {**browser_pool.stats, **browser_pool.resource_usage()},
+        "llm": dict(llm.stats),
+        "llm_calls": {name: dict(stats) for name, stats in llm.call_stats.items()},
+        "llm_cache": llm_cache.get_stats() if llm_cache else None,
+        "crm": crm_outbox.get_stats(),
+    }), 200
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route('/crm/dead-letters', methods=['GET'])
+def dead_letters():
+    limit = request.args.get('limit', 100, type=int)
+    return jsonify({"dead_letters": crm_outbox.dead_letters(limit)}), 200
+
+
+@app.route('/crm/dead-letters/retry', methods=['POST'])
+def retry_dead_letters():
+    key = (request.json or {}).get('key') if request.is_json else None
+    return jsonify({"requeued": crm_outbox.retry_dead(key)}), 200
 
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=8080)
\ No newline at end of file
+    app.run(debug=True, host='0.0.0.0', port=8080)
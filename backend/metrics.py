@@ -0,0 +1,167 @@
+from contextlib import contextmanager
+import contextvars
+import threading
+import bisect
+import time
+
+# Latency buckets in seconds, from a cached page conversion up to a slow browser load
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+PREFIX = "frank_"
+
+_current_trace = contextvars.ContextVar("trace", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Trace:
+    """
+    Time and counters spent on each stage by a single job, summed over all its threads.
+    """
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self.started = time.monotonic()
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds, error=False):
+        with self._lock:
+            stats = self.stages.setdefault(stage, {"count": 0, "seconds": 0.0, "max": 0.0, "errors": 0})
+            stats["count"] += 1
+            stats["seconds"] += seconds
+            stats["max"] = max(stats["max"], seconds)
+            stats["errors"] += int(error)
+
+    def incr(self, counter, amount=1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def summary(self):
+        with self._lock:
+            stages = {stage: {**stats, "seconds": round(stats["seconds"], 3), "max": round(stats["max"], 3)} for stage, stats in self.stages.items()}
+            return {
+                "elapsed": round((self.finished or time.monotonic()) - self.started, 3),
+                "stages": dict(sorted(stages.items(), key=lambda item: item[1]["seconds"], reverse=True)),
+                "counters": dict(self.counters),
+            }
+
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in pairs) + "}"
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def series_name(name, labels):
+    return ".".join([name, *(str(value) for _, value in sorted(labels.items()))])
+
+
+class Metrics:
+    """
+    In-process counters and latency histograms rendered in the Prometheus text format.
+    Stage timings are also added to the trace of the job running in the current context.
+    """
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def incr(self, metric, amount=1, **labels):
+        with self._lock:
+            series = self.counters.setdefault(metric, {})
+            key = label_key(labels)
+            series[key] = series.get(key, 0) + amount
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.incr(series_name(metric, labels), amount)
+
+    def observe(self, metric, value, **labels):
+        with self._lock:
+            series = self.histograms.setdefault(metric, {})
+            key = label_key(labels)
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(value)
+
+    @contextmanager
+    def timed(self, stage, **labels):
+        """
+        Time a block as a stage, errors raised inside are counted and re-raised.
+
+        Args:
+            stage: Stage name, e.g. search, fetch or llm
+            labels: Extra labels, e.g. name of the LLM call
+        """
+        started = time.monotonic()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            seconds = time.monotonic() - started
+            self.observe("stage_seconds", seconds, stage=stage, **labels)
+            if error:
+                self.incr("stage_errors_total", stage=stage, **labels)
+            trace = _current_trace.get()
+            if trace is not None:
+                trace.add(series_name(stage, labels), seconds, error)
+
+    @contextmanager
+    def trace(self):
+        """
+        Collect the stages run in this context, including threads started with a copy of it, into a Trace.
+        """
+        trace = Trace()
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            trace.finished = time.monotonic()
+            _current_trace.reset(token)
+
+    def render(self):
+        """
+        Return every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# TYPE {PREFIX}{name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{PREFIX}{name}{format_labels(key)} {value}")
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+                for key, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{PREFIX}{name}_bucket{format_labels(key, [('le', bound)])} {cumulative}")
+                    lines.append(f"{PREFIX}{name}_bucket{format_labels(key, [('le', '+Inf')])} {histogram.count}")
+                    lines.append(f"{PREFIX}{name}_sum{format_labels(key)} {histogram.sum}")
+                    lines.append(f"{PREFIX}{name}_count{format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
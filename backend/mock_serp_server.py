@@ -0,0 +1,185 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, quote_plus
+import argparse
+import threading
+import random
+import html
+import json
+import os
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+RESULTS_PER_PAGE = 10
+CONTENT_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".js": "application/javascript",
+    ".css": "text/css",
+    ".json": "application/json",
+}
+
+
+def read_fixture(*parts):
+    with open(os.path.join(FIXTURES_DIR, *parts), encoding="utf-8") as f:
+        return f.read()
+
+
+def blog_fixture_path(blog_dir, path):
+    """
+    Map a request path to a fixture file: / -> index.html, /about/ -> about.html, /assets/x.js -> assets/x.js
+    """
+    path = path.strip("/")
+    if not path:
+        return os.path.join(blog_dir, "index.html")
+    candidates = [path] if os.path.splitext(path)[1] else [path + ".html", os.path.join(path, "index.html")]
+    for candidate in candidates:
+        full = os.path.normpath(os.path.join(blog_dir, candidate))
+        if full.startswith(blog_dir) and os.path.isfile(full):
+            return full
+    return None
+
+
+class BlogHandler(BaseHTTPRequestHandler):
+    """
+    Serves one recorded blog, {{base}} in the fixtures is replaced with the blog's URL.
+    """
+    blog_dir = None
+    base_url = None
+
+    def do_GET(self):
+        full = blog_fixture_path(self.blog_dir, urlparse(self.path).path)
+        if full is None:
+            self.respond(404, "<html><head><title>Page not found</title></head><body><h1>404</h1><p>Nothing here.</p></body></html>")
+            return
+        with open(full, encoding="utf-8") as f:
+            body = f.read().replace("{{base}}", self.base_url)
+        self.respond(200, body, CONTENT_TYPES.get(os.path.splitext(full)[1], "application/octet-stream"))
+
+    def respond(self, status, body, content_type="text/html; charset=utf-8"):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SearchHandler(BlogHandler):
+    """
+    Serves Google-like HTML result pages on /search and a Programmable Search style JSON API on /customsearch/v1.
+    """
+    results = []
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        params = parse_qs(parsed.query)
+        query = params.get("q", [""])[0]
+        if parsed.path == "/search":
+            start = int(params.get("start", ["0"])[0])
+            self.respond(200, self.render_serp(query, start))
+        elif parsed.path == "/customsearch/v1":
+            start = int(params.get("start", ["1"])[0]) - 1
+            num = int(params.get("num", [str(RESULTS_PER_PAGE)])[0])
+            items = [{"link": url, "title": title} for url, title in self.ordered(query)[start:start + num]]
+            self.respond(200, json.dumps({"items": items}), CONTENT_TYPES[".json"])
+        else:
+            self.respond(404, "<html><body>Not found</body></html>")
+
+    def ordered(self, query):
+        # Every query gets the same results in its own stable order, like overlapping keywords do
+        results = list(self.results)
+        random.Random(query).shuffle(results)
+        return results
+
+    def render_serp(self, query, start):
+        results = self.ordered(query)
+        page_results = results[start:start + RESULTS_PER_PAGE]
+        result_template = read_fixture("serp", "result.html")
+        rendered = "".join(
+            result_template.replace("{{url}}", html.escape(url)).replace("{{title}}", html.escape(title)).replace("{{snippet}}", html.escape(title))
+            for url, title in page_results
+        )
+        page_count = (len(results) + RESULTS_PER_PAGE - 1) // RESULTS_PER_PAGE
+        pages = "".join(
+            f'<td><a class="fl" href="/search?q={quote_plus(query)}&amp;start={page * RESULTS_PER_PAGE}">{page + 1}</a></td>'
+            for page in range(page_count)
+        )
+        next_link = ""
+        if start + RESULTS_PER_PAGE < len(results):
+            next_link = f'<a id="pnnext" href="/search?q={quote_plus(query)}&amp;start={start + RESULTS_PER_PAGE}">Next</a>'
+        return (
+            read_fixture("serp", "results.html")
+            .replace("{{query}}", html.escape(query))
+            .replace("{{results}}", rendered)
+            .replace("{{pages}}", pages)
+            .replace("{{next}}", next_link)
+        )
+
+
+class MockSearchServer:
+    """
+    Local search engine plus one HTTP server per recorded blog, each on its own port so every blog is its own domain.
+
+    Args:
+        host: Interface to bind
+        port: Port of the search server, 0 picks a free one. Blogs always get free ports.
+        fixtures_dir: Directory with the serp/ and blogs/ fixtures
+    """
+    def __init__(self, host="127.0.0.1", port=0, fixtures_dir=FIXTURES_DIR):
+        self.host = host
+        self.servers = []
+        self.blog_urls = {}
+        blogs_dir = os.path.join(fixtures_dir, "blogs")
+        for name in sorted(os.listdir(blogs_dir)):
+            handler = type(f"{name}Handler", (BlogHandler,), {"blog_dir": os.path.join(blogs_dir, name)})
+            server = self._start(handler, 0)
+            handler.base_url = f"http://{host}:{server.server_address[1]}"
+            self.blog_urls[name] = handler.base_url
+        results = []
+        for name, url in self.blog_urls.items():
+            results.append((url + "/", f"{name} blog"))
+        # A deep link into a blog that is already in the results, the pipeline should only crawl it once
+        if "pin-with-jane" in self.blog_urls:
+            results.append((self.blog_urls["pin-with-jane"] + "/2024/03/17-reasons-your-pinterest-traffic-is-dropping/", "17 Reasons Why Your Pinterest Traffic is Dropping"))
+        for line in read_fixture("serp", "noise.txt").splitlines():
+            if line.strip() and not line.startswith("#"):
+                url, title = line.split("|", 1)
+                results.append((url, title))
+        search_handler = type("MockSearchHandler", (SearchHandler,), {"results": results})
+        server = self._start(search_handler, port)
+        self.base_url = f"http://{host}:{server.server_address[1]}"
+        self.api_url = f"{self.base_url}/customsearch/v1"
+
+    def _start(self, handler, port):
+        server = ThreadingHTTPServer((self.host, port), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.servers.append(server)
+        return server
+
+    def close(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+
+def start_mock_server(host="127.0.0.1", port=0):
+    return MockSearchServer(host, port)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve recorded SERP and blog fixtures for offline benchmarking")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    args = parser.parse_args()
+    mock = start_mock_server(args.host, args.port)
+    print("Mock search server running, point the pipeline at it with:")
+    print(f"  SERP_BASE_URL={mock.base_url}")
+    print(f"  SEARCH_PROVIDER=api SEARCH_API_URL={mock.api_url}")
+    for name, url in mock.blog_urls.items():
+        print(f"  {name}: {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        mock.close()
@@ -0,0 +1,102 @@
+from dotenv import load_dotenv
+import hashlib
+import json
+import time
+import zlib
+import os
+
+from sqlite_cache import SqliteCache
+
+load_dotenv()
+CACHE_DIR = os.getenv('CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache'))
+PAGE_CACHE_TTL = int(os.getenv('PAGE_CACHE_TTL', 7 * 24 * 3600))
+PAGE_CACHE_MAX_BYTES = int(os.getenv('PAGE_CACHE_MAX_BYTES', 500 * 1024 * 1024))
+
+
+def url_key(url):
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def compress(text):
+    if text is None:
+        return None
+    return zlib.compress(text.encode("utf-8"), 6)
+
+
+def decompress(blob):
+    if blob is None:
+        return None
+    return zlib.decompress(blob).decode("utf-8")
+
+
+class PageCache(SqliteCache):
+    """
+    On-disk cache of fetched pages keyed by URL.
+    Stores the raw HTML, the converted markdown and its links zlib compressed in SQLite,
+    expires entries after ttl seconds and evicts the least recently used
+    entries once the stored size goes over max_bytes.
+
+    Args:
+        path: Path of the SQLite database
+        ttl: Time to live of an entry in seconds
+        max_bytes: Maximum total compressed size of all entries
+    """
+    table = "pages"
+
+    def __init__(self, path=os.path.join(CACHE_DIR, 'pages.sqlite3'), ttl=PAGE_CACHE_TTL, max_bytes=PAGE_CACHE_MAX_BYTES):
+        super().__init__(path, ttl, max_bytes)
+
+    def create_table(self):
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                html BLOB,
+                markdown BLOB,
+                links BLOB,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(pages)")]
+        if "links" not in columns:
+            self._conn.execute("ALTER TABLE pages ADD COLUMN links BLOB")
+
+    def get(self, url):
+        """
+        Return a dict with the cached html, markdown and links of a URL, or None on a miss.
+        Any value can be None when it wasn't stored.
+        """
+        row = self._lookup(url_key(url), "html, markdown, links")
+        if row is None:
+            return None
+        links = decompress(row[2])
+        return {"html": decompress(row[0]), "markdown": decompress(row[1]), "links": json.loads(links) if links else None}
+
+    def put(self, url, html=None, markdown=None, links=None):
+        """
+        Store the html, markdown and/or links of a URL. Values that are None keep what is already stored.
+        links is any JSON serializable value.
+        """
+        key = url_key(url)
+        now = time.time()
+        html_blob = compress(html)
+        markdown_blob = compress(markdown)
+        links_blob = compress(json.dumps(links)) if links is not None else None
+        self._write(key, [
+            ("""
+                INSERT INTO pages (key, url, html, markdown, links, size, created_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, 0, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    html = COALESCE(excluded.html, pages.html),
+                    markdown = COALESCE(excluded.markdown, pages.markdown),
+                    links = COALESCE(excluded.links, pages.links),
+                    created_at = CASE WHEN excluded.html IS NOT NULL THEN excluded.created_at ELSE pages.created_at END,
+                    accessed_at = excluded.accessed_at
+            """, (key, url, html_blob, markdown_blob, links_blob, now, now)),
+            ("UPDATE pages SET size = IFNULL(LENGTH(html), 0) + IFNULL(LENGTH(markdown), 0) + IFNULL(LENGTH(links), 0) WHERE key = ?", (key,)),
+        ])
+
+
+page_cache = PageCache()
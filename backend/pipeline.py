@@ -0,0 +1,113 @@
+from urllib.parse import urlparse
+
+from browser_pool import browser_pool
+from crawl import crawl_domains
+from search_providers import get_search_provider
+from result_store import result_store, normalize_domain, entry_to_post
+from metrics import metrics
+from ai import filter_personal_blogs, filter_irrelavant_urls, extract_blog_data_recursively, extract_blog_content_and_links, send_results_to_crm
+
+search_provider = get_search_provider()
+
+
+def run_keyword(job, claim_domain=None):
+    """
+    Run the full discovery and enrichment pipeline for a single keyword.
+    Progress counters and results are written to the job as they are produced.
+
+    Args:
+        job: Job instance holding the keyword to process
+        claim_domain: Optional callable taking a normalized domain, returns False when another
+            keyword of the same campaign already handles it
+    """
+    keyword = job.keyword
+    print(f"Keyword received: {keyword}")
+    with metrics.timed("search", provider=search_provider.name):
+        results_hrefs, pages = search_provider.search(keyword)
+    metrics.incr("search_pages_total", pages)
+    metrics.incr("search_results_total", len(results_hrefs))
+    job.incr("search_pages", pages)
+    job.incr("search_results", len(results_hrefs))
+    # Domains handled recently are answered from the result store instead of being classified and crawled again
+    new_hrefs = []
+    known_hrefs = []
+    seen_domains = set()
+    for href in results_hrefs:
+        domain = normalize_domain(href)
+        if domain in seen_domains:
+            continue
+        seen_domains.add(domain)
+        if claim_domain is not None and not claim_domain(domain):
+            job.incr("blogs_duplicate")
+            continue
+        entry = result_store.get_fresh(href)
+        if entry is None:
+            new_hrefs.append(href)
+            continue
+        job.incr("blogs_skipped")
+        if entry["status"] != "rejected":
+            known_hrefs.append(href)
+        if entry["status"] == "lead":
+            post = entry_to_post(entry)
+            if entry["crm_status"] not in ("sent", "queued", "retrying", "dead"):
+                send_results_to_crm(post)
+            job.add_post(post)
+            job.incr("leads_found")
+    filtered_hrefs = []
+    if new_hrefs:
+        with metrics.timed("classify"):
+            filtered_hrefs = filter_personal_blogs(new_hrefs)
+    filtered_domains = {normalize_domain(href) for href in filtered_hrefs}
+    result_store.mark_rejected([href for href in new_hrefs if normalize_domain(href) not in filtered_domains])
+    job.set_results(known_hrefs + filtered_hrefs)
+    job.incr("candidate_blogs", len(filtered_hrefs))
+    for result in crawl_domains(filtered_hrefs, process_domain):
+        job.incr("blogs_processed")
+        if not result.ok:
+            job.incr("blogs_failed")
+            metrics.incr("domains_failed_total")
+            print(f"An error occurred while processing {result.href}: {result.error}")
+            continue
+        if result.data:
+            job.add_post(result.data)
+            job.incr("leads_found")
+            metrics.incr("leads_total")
+    print("Finished keyword: ", keyword)
+
+
+def process_domain(href, deadline):
+    """
+    Crawl a single blog and send its data to the CRM if an email was found.
+    A browser is only leased from the pool once a page actually needs to be loaded.
+
+    Args:
+        href: URL of the blog
+        deadline: time.monotonic() value after which no new pages are loaded
+    Returns:
+        Extracted data or None when nothing useful was found
+    """
+    with browser_pool.lazy_lease() as driver:
+        md_content, links = extract_blog_content_and_links(driver, href)
+        if len(links) == 0:
+            print(f"No links found in {href}")
+            result_store.save(href, {"website": href})
+            return None
+        print(f"Links found: {len(links)}, here's one: {links[0]}")
+        relevant_urls = filter_irrelavant_urls(links)
+        if len(relevant_urls) == 0:
+            print(f"No relevant URLs found in {href}")
+            result_store.save(href, {"website": href})
+            return None
+        extracted_data = extract_blog_data_recursively(driver, relevant_urls, deadline=deadline, home_url=root_url(href))
+    extracted_data['website'] = href
+    result_store.save(href, extracted_data)
+    if not extracted_data.get('email'):
+        print(f"No email found for {href}, skipping CRM submission.")
+        return None
+    send_results_to_crm(extracted_data)
+    return extracted_data
+
+
+def root_url(href):
+    parsed_url = urlparse(href)
+    return f"{parsed_url.scheme}://{parsed_url.netloc}"
@@ -0,0 +1,109 @@
+from dotenv import load_dotenv
+import re
+import os
+
+from url_filter import score_url
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:
+    # Without tiktoken (or its encoding files) fall back to ~4 characters per token
+    _encoding = None
+
+load_dotenv()
+PAGE_TOKEN_BUDGET = int(os.getenv('PAGE_TOKEN_BUDGET', 3000))
+LINKS_TOKEN_BUDGET = int(os.getenv('LINKS_TOKEN_BUDGET', 1500))
+# Lines kept from the top and bottom of a page, that's where navigation, bylines and footers live
+HEADER_LINES = 15
+FOOTER_LINES = 25
+
+RELEVANT_BLOCK_RE = re.compile(
+    r'about|contact|e-?mail|mailto:|@|\bhi,? i\'?m\b|\bmy name\b|\bi am\b|founder|creator|\bbio\b|'
+    r'course|shop|product|ebook|coaching|work with me|hire me|masterclass|membership|template',
+    re.IGNORECASE,
+)
+ANCHOR_RE = re.compile(r'about|contact|shop|store|course|product|work with me|hire|coaching|services|start here', re.IGNORECASE)
+
+
+def count_tokens(text):
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def truncate_to_tokens(text, budget):
+    if count_tokens(text) <= budget:
+        return text
+    if _encoding is not None:
+        return _encoding.decode(_encoding.encode(text, disallowed_special=())[:budget])
+    return text[:budget * 4]
+
+
+def select_page_content(markdown, budget=PAGE_TOKEN_BUDGET):
+    """
+    Pick the parts of a page most likely to hold owner information within a token budget.
+    The header and footer are always kept, then the blocks mentioning about/contact/products
+    are added by relevance. Selected blocks keep their original order.
+
+    Args:
+        markdown: Markdown of the page
+        budget: Maximum number of tokens of the result
+    """
+    if count_tokens(markdown) <= budget:
+        return markdown
+    lines = markdown.split("\n")
+    if len(lines) <= HEADER_LINES + FOOTER_LINES:
+        return truncate_to_tokens(markdown, budget)
+    header = list(range(HEADER_LINES))
+    footer = list(range(len(lines) - FOOTER_LINES, len(lines)))
+    middle = range(HEADER_LINES, len(lines) - FOOTER_LINES)
+    selected = set()
+    used = 0
+    for index in header + footer:
+        cost = count_tokens(lines[index]) + 1
+        if used + cost > budget:
+            break
+        selected.add(index)
+        used += cost
+    # Relevant lines first, each with its neighbour for context, then the rest of the page from the top
+    relevant = [i for i in middle if RELEVANT_BLOCK_RE.search(lines[i])]
+    candidates = []
+    for i in relevant:
+        candidates += [i, i + 1] if i + 1 in middle else [i]
+    candidates += list(middle)
+    for index in candidates:
+        if index in selected:
+            continue
+        cost = count_tokens(lines[index]) + 1
+        if used + cost > budget:
+            continue
+        selected.add(index)
+        used += cost
+    return "\n".join(lines[i] for i in sorted(selected))
+
+
+def link_score(link, anchors=None):
+    text = (anchors or {}).get(link) or ""
+    return score_url(link) + (2 if ANCHOR_RE.search(text) else 0)
+
+
+def rank_links(links, anchors=None, budget=LINKS_TOKEN_BUDGET):
+    """
+    Order links by how likely they lead to owner information and keep as many as fit in the token budget.
+
+    Args:
+        links: List of URLs
+        anchors: Optional dict of URL to anchor text
+        budget: Maximum number of tokens of the kept links
+    """
+    ranked = sorted(dict.fromkeys(links), key=lambda link: link_score(link, anchors), reverse=True)
+    kept = []
+    used = 0
+    for link in ranked:
+        cost = count_tokens(link) + 2
+        if used + cost > budget:
+            break
+        kept.append(link)
+        used += cost
+    return kept
@@ -0,0 +1,152 @@
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+import threading
+import sqlite3
+import time
+import os
+
+from page_cache import CACHE_DIR
+
+load_dotenv()
+RESULT_STORE_PATH = os.getenv('RESULT_STORE_PATH', os.path.join(CACHE_DIR, 'results.sqlite3'))
+# Domains crawled more recently than this are skipped
+RESULT_REFRESH_AGE = int(os.getenv('RESULT_REFRESH_AGE', 30 * 24 * 3600))
+FIELDS = ("email", "name", "bio", "course_product")
+
+
+def normalize_domain(url):
+    """
+    Return the normalized root domain of a URL, e.g. https://WWW.Example.com/about -> example.com
+    """
+    if "://" not in url:
+        url = "http://" + url
+    netloc = urlparse(url).netloc.lower()
+    netloc = netloc.rsplit("@", 1)[-1]
+    if netloc.endswith(":80") or netloc.endswith(":443"):
+        netloc = netloc.rsplit(":", 1)[0]
+    if netloc.startswith("www."):
+        netloc = netloc[4:]
+    return netloc
+
+
+class ResultStore:
+    """
+    Remembers every blog domain that was processed, what was extracted from it and whether it reached the CRM.
+
+    Args:
+        path: Path of the SQLite database
+        refresh_age: Age in seconds after which a domain is crawled again
+    """
+    def __init__(self, path=RESULT_STORE_PATH, refresh_age=RESULT_REFRESH_AGE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.refresh_age = refresh_age
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS domains (
+                domain TEXT PRIMARY KEY,
+                website TEXT,
+                status TEXT NOT NULL,
+                email TEXT,
+                name TEXT,
+                bio TEXT,
+                course_product TEXT,
+                email_found_at REAL,
+                name_found_at REAL,
+                bio_found_at REAL,
+                course_product_found_at REAL,
+                crawled_at REAL NOT NULL,
+                crm_status TEXT,
+                crm_updated_at REAL
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, url):
+        """
+        Return the stored entry of the domain of a URL as a dict, or None.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM domains WHERE domain = ?", (normalize_domain(url),)).fetchone()
+        return dict(row) if row else None
+
+    def is_fresh(self, entry):
+        return entry is not None and time.time() - entry["crawled_at"] < self.refresh_age
+
+    def get_fresh(self, url):
+        entry = self.get(url)
+        return entry if self.is_fresh(entry) else None
+
+    def save(self, url, data):
+        """
+        Record the data extracted from a domain. Fields that were found before and are missing now are kept.
+
+        Args:
+            url: Any URL of the domain
+            data: Extracted data dict with email/name/bio/course_product keys
+        """
+        now = time.time()
+        values = {field: data.get(field) for field in FIELDS}
+        status = "lead" if values["email"] else "no_email"
+        with self._lock:
+            self._conn.execute("""
+                INSERT INTO domains (domain, website, status, email, name, bio, course_product,
+                    email_found_at, name_found_at, bio_found_at, course_product_found_at, crawled_at)
+                VALUES (:domain, :website, :status, :email, :name, :bio, :course_product,
+                    :email_found_at, :name_found_at, :bio_found_at, :course_product_found_at, :now)
+                ON CONFLICT(domain) DO UPDATE SET
+                    website = excluded.website,
+                    status = CASE WHEN domains.status = 'lead' THEN 'lead' ELSE excluded.status END,
+                    email = COALESCE(excluded.email, domains.email),
+                    name = COALESCE(excluded.name, domains.name),
+                    bio = COALESCE(excluded.bio, domains.bio),
+                    course_product = COALESCE(excluded.course_product, domains.course_product),
+                    email_found_at = COALESCE(excluded.email_found_at, domains.email_found_at),
+                    name_found_at = COALESCE(excluded.name_found_at, domains.name_found_at),
+                    bio_found_at = COALESCE(excluded.bio_found_at, domains.bio_found_at),
+                    course_product_found_at = COALESCE(excluded.course_product_found_at, domains.course_product_found_at),
+                    crawled_at = excluded.crawled_at
+            """, {
+                "domain": normalize_domain(url),
+                "website": data.get("website") or url,
+                "status": status,
+                "now": now,
+                **values,
+                **{f"{field}_found_at": now if values[field] else None for field in FIELDS},
+            })
+            self._conn.commit()
+
+    def mark_rejected(self, urls):
+        """
+        Record domains that were classified as not being personal blogs so they aren't sent to the LLM again.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.executemany("""
+                INSERT INTO domains (domain, website, status, crawled_at) VALUES (?, ?, 'rejected', ?)
+                ON CONFLICT(domain) DO UPDATE SET crawled_at = excluded.crawled_at
+                WHERE domains.status = 'rejected'
+            """, [(normalize_domain(url), url, now) for url in urls])
+            self._conn.commit()
+
+    def set_crm_status(self, url, crm_status):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE domains SET crm_status = ?, crm_updated_at = ? WHERE domain = ?",
+                (crm_status, time.time(), normalize_domain(url)),
+            )
+            self._conn.commit()
+
+
+def entry_to_post(entry):
+    """
+    Convert a stored entry back to the shape returned by extract_blog_data_recursively.
+    """
+    post = {field: entry[field] for field in FIELDS}
+    post["website"] = entry["website"]
+    return post
+
+
+result_store = ResultStore()
@@ -0,0 +1,112 @@
+from abc import ABC, abstractmethod
+from dotenv import load_dotenv
+import requests
+import os
+
+from browser_pool import browser_pool
+from serp import collect_serp_results, SERP_BASE_URL, SERP_MAX_PAGES, SERP_MAX_RESULTS
+from url_filter import normalize_url
+
+load_dotenv()
+SEARCH_PROVIDER = os.getenv('SEARCH_PROVIDER', 'html')
+# Defaults follow the Google Programmable Search JSON API, the mock server speaks the same format
+SEARCH_API_URL = os.getenv('SEARCH_API_URL', 'https://www.googleapis.com/customsearch/v1')
+SEARCH_API_KEY = os.getenv('SEARCH_API_KEY')
+SEARCH_API_CX = os.getenv('SEARCH_API_CX')
+SEARCH_API_PAGE_SIZE = int(os.getenv('SEARCH_API_PAGE_SIZE', 10))
+SEARCH_API_TIMEOUT = float(os.getenv('SEARCH_API_TIMEOUT', 20))
+
+
+class SearchProvider(ABC):
+    """
+    Finds candidate blog URLs for a keyword.
+    """
+    name = None
+
+    @abstractmethod
+    def search(self, keyword, max_results=SERP_MAX_RESULTS):
+        """
+        Args:
+            keyword: Search query
+            max_results: Maximum number of unique result URLs
+        Returns:
+            Tuple of (result URLs, number of result pages loaded)
+        """
+
+
+class HtmlSearchProvider(SearchProvider):
+    """
+    Scrapes the HTML result pages of a search engine with a pooled browser.
+
+    Args:
+        base_url: Scheme and host of the search engine, e.g. the mock server
+        max_pages: Maximum number of result pages to load
+    """
+    name = "html"
+
+    def __init__(self, base_url=SERP_BASE_URL, max_pages=SERP_MAX_PAGES):
+        self.base_url = base_url
+        self.max_pages = max_pages
+
+    def search(self, keyword, max_results=SERP_MAX_RESULTS):
+        with browser_pool.lease() as driver:
+            return collect_serp_results(driver, keyword, max_pages=self.max_pages, max_results=max_results, base_url=self.base_url)
+
+
+class JsonApiSearchProvider(SearchProvider):
+    """
+    Queries a JSON search API page by page over a pooled HTTP session.
+    Expects the Google Programmable Search response format: {"items": [{"link": ...}, ...]}.
+
+    Args:
+        api_url: Endpoint of the search API
+        api_key: API key sent as the key parameter
+        cx: Search engine id sent as the cx parameter
+        max_pages: Maximum number of result pages to request
+    """
+    name = "api"
+
+    def __init__(self, api_url=SEARCH_API_URL, api_key=SEARCH_API_KEY, cx=SEARCH_API_CX, max_pages=SERP_MAX_PAGES):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.cx = cx
+        self.max_pages = max_pages
+        self.session = requests.Session()
+
+    def search(self, keyword, max_results=SERP_MAX_RESULTS):
+        results_hrefs = []
+        seen = set()
+        pages = 0
+        for page in range(self.max_pages):
+            params = {"q": keyword, "start": page * SEARCH_API_PAGE_SIZE + 1, "num": SEARCH_API_PAGE_SIZE}
+            if self.api_key:
+                params["key"] = self.api_key
+            if self.cx:
+                params["cx"] = self.cx
+            response = self.session.get(self.api_url, params=params, timeout=SEARCH_API_TIMEOUT)
+            response.raise_for_status()
+            pages += 1
+            items = response.json().get("items") or []
+            new = 0
+            for item in items:
+                href = item.get("link")
+                if not href or normalize_url(href) in seen:
+                    continue
+                seen.add(normalize_url(href))
+                results_hrefs.append(href)
+                new += 1
+            if new == 0 or len(items) < SEARCH_API_PAGE_SIZE or len(results_hrefs) >= max_results:
+                break
+        return results_hrefs[:max_results], pages
+
+
+search_providers = {
+    HtmlSearchProvider.name: HtmlSearchProvider,
+    JsonApiSearchProvider.name: JsonApiSearchProvider,
+}
+
+
+def get_search_provider(name=SEARCH_PROVIDER, **kwargs):
+    if name not in search_providers:
+        raise ValueError(f"Unknown search provider: {name}")
+    return search_providers[name](**kwargs)
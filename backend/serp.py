@@ -0,0 +1,103 @@
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from urllib.parse import quote_plus
+from dotenv import load_dotenv
+import os
+
+from url_filter import normalize_url
+
+load_dotenv()
+SERP_BASE_URL = os.getenv('SERP_BASE_URL', 'https://www.google.com')
+SERP_MAX_PAGES = int(os.getenv('SERP_MAX_PAGES', 10))
+SERP_MAX_RESULTS = int(os.getenv('SERP_MAX_RESULTS', 100))
+SERP_RESULTS_PER_PAGE = int(os.getenv('SERP_RESULTS_PER_PAGE', 10))
+SERP_TIMEOUT = int(os.getenv('SERP_TIMEOUT', 20))
+google_list_selector = os.getenv('SERP_LIST_SELECTOR', "#rso")
+results_a_tag_selector = os.getenv('SERP_RESULT_SELECTOR', "#rso > div > div > div > div.kb0PBd.A9Y9g.jGGQ5e > div > div > span > a")
+next_page_selector = os.getenv('SERP_NEXT_SELECTOR', "#pnnext")
+
+
+def serp_page_url(keyword, page, base_url=SERP_BASE_URL, per_page=SERP_RESULTS_PER_PAGE):
+    return f"{base_url}/search?q={quote_plus(keyword)}&start={page * per_page}"
+
+
+def collect_serp_results(driver, keyword, max_pages=SERP_MAX_PAGES, max_results=SERP_MAX_RESULTS, base_url=SERP_BASE_URL):
+    """
+    Collect the result links of pages 1..max_pages for a keyword by loading the paginated
+    search URLs directly. Results are deduplicated across pages.
+    Stops early once max_results links are collected, a page has no new results or there is no next page.
+
+    Args:
+        driver: WebDriver instance
+        keyword: Search query
+        max_pages: Maximum number of result pages to load
+        max_results: Stop once this many unique results are collected
+        base_url: Scheme and host of the search engine
+    Returns:
+        Tuple of (result URLs, number of pages loaded)
+    """
+    results_hrefs = []
+    seen = set()
+    pages = 0
+    for page in range(max_pages):
+        driver.get(serp_page_url(keyword, page, base_url))
+        pages += 1
+        try:
+            wait_for_elements(driver, [(By.CSS_SELECTOR, results_a_tag_selector)], timeout=SERP_TIMEOUT)
+        except TimeoutException:
+            print(f"No results on page {page + 1} for {keyword}, stopping.")
+            break
+        page_hrefs = []
+        collect_results(driver, page_hrefs)
+        new = 0
+        for href in page_hrefs:
+            key = normalize_url(href)
+            if key in seen:
+                continue
+            seen.add(key)
+            results_hrefs.append(href)
+            new += 1
+        print(f"Page {page + 1}: {new} new results, {len(results_hrefs)} total")
+        if new == 0 or len(results_hrefs) >= max_results:
+            break
+        if not driver.find_elements(By.CSS_SELECTOR, next_page_selector):
+            break
+    return results_hrefs[:max_results], pages
+
+
+def wait_for_elements(driver, element_locators, timeout=30):
+    """
+    Wait for multiple elements to be present
+
+    Args:
+        driver: WebDriver instance
+        element_locators: List of tuples (By, selector)
+        timeout: Maximum wait time in seconds
+    """
+    for by, selector in element_locators:
+        WebDriverWait(driver, timeout).until(
+            EC.presence_of_element_located((by, selector))
+        )
+
+
+def collect_results(driver, results_hrefs):
+    """
+    Collect all result links from the current page
+
+    Args:
+        driver: WebDriver instance
+        results_hrefs: List to append results to
+    """
+    # Get result container
+    results_list = driver.find_element(By.CSS_SELECTOR, google_list_selector)
+
+    # Get all result links
+    results = results_list.find_elements(By.CSS_SELECTOR, results_a_tag_selector)
+
+    # Extract hrefs
+    for result in results:
+        href = result.get_attribute("href")
+        if href:
+            results_hrefs.append(href)
@@ -0,0 +1,102 @@
+from abc import ABC, abstractmethod
+import threading
+import sqlite3
+import time
+import os
+
+
+class SqliteCache(ABC):
+    """
+    Base of the on-disk caches: a SQLite table with key, size, created_at and accessed_at columns.
+    Entries expire after ttl seconds and the least recently used entries are evicted once the stored size
+    goes over max_bytes. Subclasses name the table and create it in create_table.
+
+    Args:
+        path: Path of the SQLite database
+        ttl: Time to live of an entry in seconds
+        max_bytes: Maximum total compressed size of all entries
+        stats: Extra counters of the subclass, added to hits, misses and evictions
+    """
+    table = None
+
+    def __init__(self, path, ttl, max_bytes, stats=()):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, **{name: 0 for name in stats}}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self.create_table()
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_accessed_at ON {self.table} (accessed_at)")
+        self._conn.commit()
+        self._total = self._conn.execute(f"SELECT IFNULL(SUM(size), 0) FROM {self.table}").fetchone()[0]
+
+    @abstractmethod
+    def create_table(self):
+        """
+        Create the table if it doesn't exist yet, it must have key, size, created_at and accessed_at columns.
+        """
+
+    def _lookup(self, key, columns):
+        """
+        Return the values of columns for a live entry and mark it as used, or None on a miss.
+        Expired entries are deleted on the way.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(f"SELECT {columns}, created_at, size FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[-2] > self.ttl:
+                if row is not None:
+                    self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                    self._conn.commit()
+                    self._total -= row[-1]
+                self.stats["misses"] += 1
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.stats["hits"] += 1
+        return row[:-2]
+
+    def _write(self, key, statements):
+        """
+        Run the statements storing an entry, then account for its new size and evict if needed.
+
+        Args:
+            key: Key of the entry
+            statements: List of (sql, params) tuples, the entry must have its size column set afterwards
+        """
+        with self._lock:
+            old = self._conn.execute(f"SELECT size FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            for sql, params in statements:
+                self._conn.execute(sql, params)
+            size = self._conn.execute(f"SELECT size FROM {self.table} WHERE key = ?", (key,)).fetchone()[0]
+            self._total += size - (old[0] if old else 0)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        if self._total <= self.max_bytes:
+            return
+        # Drop expired entries first, then the least recently used ones
+        self._conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (time.time() - self.ttl,))
+        self._total = self._conn.execute(f"SELECT IFNULL(SUM(size), 0) FROM {self.table}").fetchone()[0]
+        for key, size in self._conn.execute(f"SELECT key, size FROM {self.table} ORDER BY accessed_at").fetchall():
+            if self._total <= self.max_bytes:
+                break
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._total -= size
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._conn.commit()
+            self._total = 0
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,164 @@
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+from dotenv import load_dotenv
+import re
+import os
+
+load_dotenv()
+
+# Platforms and companies that never are the personal blogs we're looking for
+DEFAULT_BLOCKLIST = {
+    "google.com", "youtube.com", "youtu.be", "facebook.com", "instagram.com", "twitter.com", "x.com",
+    "tiktok.com", "linkedin.com", "reddit.com", "quora.com", "pinterest.com", "pinterest.co.uk",
+    "wikipedia.org", "amazon.com", "etsy.com", "ebay.com", "apple.com", "microsoft.com",
+    "hubspot.com", "shopify.com", "canva.com", "tailwindapp.com", "later.com", "hootsuite.com",
+    "sproutsocial.com", "buffer.com", "semrush.com", "ahrefs.com", "moz.com", "neilpatel.com",
+    "forbes.com", "entrepreneur.com", "businessinsider.com", "nytimes.com", "theverge.com",
+    "techcrunch.com", "wikihow.com", "udemy.com", "coursera.org", "skillshare.com",
+}
+DEFAULT_ALLOWLIST = set()
+
+TRACKING_PARAMS = {"fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "igshid", "srsltid", "_ga", "_gl", "ref", "ref_src"}
+ASSET_RE = re.compile(r'\.(?:jpe?g|png|gif|bmp|svg|webp|ico|css|js|json|xml|pdf|zip|mp3|mp4|mov|avi|woff2?|ttf|eot)$', re.IGNORECASE)
+# Archive, feed and technical pages that never hold owner information
+JUNK_PATH_RE = re.compile(
+    r'/(?:tag|tags|category|categories|page/\d+|feed|rss|comments|wp-json|wp-content|wp-includes|wp-admin|wp-login\.php|'
+    r'cdn-cgi|xmlrpc\.php|search|cart|checkout|login|register|my-account|privacy(?:-policy)?|terms(?:-of-service|-and-conditions)?|'
+    r'cookie(?:-policy)?|disclaimer|amp)(?:/|$)',
+    re.IGNORECASE,
+)
+
+
+def path_segment(*names):
+    """
+    Match paths whose last segment is one of names, e.g. /about or /en/about-me/, optionally under one
+    locale or parent segment. Post slugs like /about-my-trip-to-paris/ or /bio-hacking-tips/ don't match.
+    """
+    return re.compile(r'^/(?:[^/\d][^/]*/)?(?:' + '|'.join(names) + r')(?:\.html?|\.php)?/?$', re.IGNORECASE)
+
+
+PATH_SCORES = [
+    (path_segment('contact', 'contact-me', 'contact-us', 'get-in-touch', 'say-hello'), 3),
+    (path_segment('about', 'about-me', 'about-us', 'meet', 'meet-me', 'who-i-am', 'my-story', 'bio'), 3),
+    (path_segment('work-with-me', 'hire-me', 'coaching', 'services', 'start-here', 'media-kit', 'press', 'collaborate', 'advertise'), 2),
+    (path_segment('shop', 'store', 'products?', 'courses?', 'academy', 'masterclass', 'ebooks?', 'templates?', 'membership'), 2),
+]
+
+
+def load_domain_list(env_name, file_env_name, defaults):
+    """
+    Build a domain list from the defaults, a comma separated env variable and a file with one domain per line.
+    """
+    domains = set(defaults)
+    domains.update(d.strip().lower() for d in os.getenv(env_name, "").split(",") if d.strip())
+    path = os.getenv(file_env_name)
+    if path and os.path.exists(path):
+        with open(path) as f:
+            domains.update(line.strip().lower() for line in f if line.strip() and not line.startswith("#"))
+    return domains
+
+
+blocklist = load_domain_list("URL_BLOCKLIST", "URL_BLOCKLIST_FILE", DEFAULT_BLOCKLIST)
+allowlist = load_domain_list("URL_ALLOWLIST", "URL_ALLOWLIST_FILE", DEFAULT_ALLOWLIST)
+
+
+def host_of(url):
+    # The port is kept so sites on the same host but different ports stay apart
+    host = urlparse(url).netloc.lower().rsplit("@", 1)[-1]
+    return host[4:] if host.startswith("www.") else host
+
+
+def matches_domain(host, domains):
+    """
+    Suffix match so blog.example.com matches example.com.
+    """
+    parts = host.split(":")[0].split(".")
+    return any(".".join(parts[i:]) in domains for i in range(len(parts)))
+
+
+def normalize_url(url):
+    """
+    Normalize a URL for deduplication: lowercase scheme and host, no default port, fragment,
+    tracking parameters or trailing slash, sorted query.
+    """
+    parsed = urlparse(url.strip())
+    scheme = parsed.scheme.lower() or "http"
+    netloc = (parsed.hostname or "").lower()
+    if parsed.port and not (scheme == "http" and parsed.port == 80) and not (scheme == "https" and parsed.port == 443):
+        netloc = f"{netloc}:{parsed.port}"
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    )
+    path = parsed.path or "/"
+    if len(path) > 1:
+        path = path.rstrip("/")
+    return urlunparse((scheme, netloc, path, "", urlencode(query), ""))
+
+
+def score_url(url):
+    """
+    Score how likely a page of a blog holds owner information: > 0 is promising,
+    0 is unknown and < 0 means the page is not worth visiting.
+    """
+    path = urlparse(url).path
+    if ASSET_RE.search(path) or JUNK_PATH_RE.search(path):
+        return -1
+    if path in ("", "/"):
+        return 1
+    return max((score for pattern, score in PATH_SCORES if pattern.search(path)), default=0)
+
+
+def prefilter_blog_urls(urls):
+    """
+    Rule based pass in front of the personal blog classifier.
+    Removes duplicates (one URL per domain), assets and blocklisted domains.
+
+    Args:
+        urls: Raw search result URLs
+    Returns:
+        (accepted, ambiguous) where accepted are allowlisted and ambiguous still need the LLM
+    """
+    accepted = []
+    ambiguous = []
+    seen_hosts = set()
+    for url in urls:
+        if not url.startswith(("http://", "https://")):
+            continue
+        host = host_of(url)
+        if not host or host in seen_hosts:
+            continue
+        seen_hosts.add(host)
+        if ASSET_RE.search(urlparse(url).path) or matches_domain(host, blocklist):
+            continue
+        if matches_domain(host, allowlist):
+            accepted.append(url)
+        else:
+            ambiguous.append(url)
+    return accepted, ambiguous
+
+
+def prefilter_site_links(urls):
+    """
+    Rule based pass in front of the relevant URL classifier for the links of one blog.
+    Normalizes and dedupes the links and scores them by path.
+
+    Args:
+        urls: Links found on the blog
+    Returns:
+        (accepted, ambiguous) where accepted look like contact/about/shop pages and ambiguous still need the LLM
+    """
+    accepted = []
+    ambiguous = []
+    seen = set()
+    for url in urls:
+        normalized = normalize_url(url)
+        if normalized in seen:
+            continue
+        seen.add(normalized)
+        score = score_url(normalized)
+        if score > 1:
+            accepted.append(normalized)
+        elif score >= 0:
+            ambiguous.append(normalized)
+    accepted.sort(key=score_url, reverse=True)
+    return accepted, ambiguous